@@ -4,12 +4,79 @@ from typing import List
 class Settings(BaseSettings):
     mongodb_url: str
     database_name: str = "prodesk_chatbot"
+    ensure_indexes_on_startup: bool = True
+    conversation_page_size: int = 50
+    export_batch_size: int = 500
     groq_api_key: str = ""
     api_host: str = "0.0.0.0"    # not used directly
     api_port: int = 8000         # not used directly
     cors_origins: List[str] = ["*"]
     vectorstore_path: str = "./data/vectorstore"
     knowledge_file: str = "./data/prodesk_knowledge.json"
+    knowledge_snapshot_path: str = "./data/knowledge.snapshot"
+    chunk_max_words: int = 80
+    chunk_overlap_words: int = 20
+    context_max_chars: int = 800
+    groq_base_url: str = "https://api.groq.com"
+    groq_model: str = "llama-3.1-8b-instant"
+    groq_timeout: float = 10.0
+    groq_max_retries: int = 2
+    groq_max_concurrency: int = 16
+
+    # Answer cache
+    response_cache_ttl: float = 3600
+    response_cache_max_entries: int = 10000
+    response_cache_max_bytes: int = 32 * 1024 * 1024
+    response_cache_mongo: bool = False
+
+    # API key resolution cache
+    api_key_cache_ttl: float = 60
+    api_key_negative_ttl: float = 10
+    # Bound on cross-worker staleness: cached clients re-check key_version this often
+    api_key_version_ttl: float = 5
+    api_key_cache_max_entries: int = 10000
+
+    # Top-queries sketch
+    query_sketch_k: int = 64
+    query_sketch_width: int = 512
+    query_sketch_depth: int = 4
+    query_sketch_flush_interval: float = 30
+
+    # Seconds between knowledge file mtime checks; 0 disables hot reload
+    knowledge_reload_interval: float = 30
+
+    # Dense retrieval over the shared knowledge (hashed TF-IDF + SVD, CPU only)
+    vector_search_enabled: bool = True
+    vector_dim: int = 256
+    vector_quantize: bool = False
+    vector_min_score: float = 0.5
+
+    # Hybrid retrieval: keyword and vector candidates fused, then reranked
+    retrieval_candidates: int = 50
+    retrieval_threads: int = 4
+    rrf_k: int = 60
+    rerank_weight: float = 0.5
+    # Passages scoring below this fraction of the best are left out of the prompt
+    rerank_min_ratio: float = 0.3
+
+    # Per-tenant knowledge indexes
+    tenant_index_max_entries: int = 1000
+    tenant_index_max_bytes: int = 64 * 1024 * 1024
+
+    # Write-behind persistence of chat turns
+    write_behind_max_queue: int = 10000
+    write_behind_batch_size: int = 200
+    write_behind_max_age: float = 0.05
+
+    # Shared outbound HTTP client
+    http2_enabled: bool = True
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_connect_timeout: float = 5.0
+    http_read_timeout: float = 10.0
+    http_write_timeout: float = 5.0
+    http_pool_timeout: float = 5.0
 
     model_config = SettingsConfigDict(
         env_file=".env",
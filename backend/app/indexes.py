@@ -0,0 +1,110 @@
+"""
+MongoDB index registry
+Every hot query's filter and sort should be covered by an entry here
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from typing import Dict, List
+from .database import get_collection
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "clients": [
+        # API key auth (resolver) and duplicate-email check in create_client
+        IndexModel([("api_key", ASCENDING)], name="api_key_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email"),
+        # Keyset pagination in list_clients
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_id"),
+    ],
+    "conversations": [
+        # One header per session: sequence reservation, lead attach and get_conversation
+        IndexModel(
+            [("client_id", ASCENDING), ("session_id", ASCENDING)],
+            name="client_session_unique",
+            unique=True
+        ),
+        # analytics counts and "today" ranges
+        IndexModel([("client_id", ASCENDING), ("created_at", DESCENDING)], name="client_created"),
+    ],
+    "conversation_messages": [
+        # Page upserts and paged reads for a session
+        IndexModel(
+            [("client_id", ASCENDING), ("session_id", ASCENDING), ("page", ASCENDING)],
+            name="client_session_page",
+            unique=True
+        ),
+    ],
+    "leads": [
+        # Keyset-paginated listing (newest first), date filters and analytics counts
+        IndexModel(
+            [("client_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="client_created_id"
+        ),
+        # Email prefix search
+        IndexModel([("client_id", ASCENDING), ("email", ASCENDING)], name="client_email"),
+    ],
+    "analytics_rollups": [
+        # $inc upserts and time-range reads per granularity
+        IndexModel(
+            [("client_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)],
+            name="client_granularity_bucket",
+            unique=True
+        ),
+    ],
+    "response_cache": [
+        # Mongo tier of the answer cache; documents expire on their own
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+
+def _key_spec(keys) -> List[tuple]:
+    """Normalize index keys; the server may report directions as floats"""
+    return [(field, int(direction) if isinstance(direction, float) else direction) for field, direction in keys]
+
+
+async def ensure_indexes() -> Dict[str, Dict[str, List[str]]]:
+    """
+    Create missing registry indexes and report drift.
+
+    Idempotent: existing indexes with the same name and keys are left alone.
+    Returns {collection: {"created": [...], "extra": [...], "conflicting": [...]}}.
+    """
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = get_collection(collection_name)
+        if collection is None:
+            logger.warning("Database unavailable, skipping index provisioning")
+            return report
+
+        existing = await collection.index_information()
+        wanted = {model.document["name"]: model for model in models}
+
+        missing = []
+        conflicting = []
+        for name, model in wanted.items():
+            if name not in existing:
+                missing.append(model)
+            elif _key_spec(existing[name]["key"]) != _key_spec(model.document["key"].items()):
+                conflicting.append(name)
+
+        # One at a time so a single conflict doesn't block the rest
+        created = []
+        for model in missing:
+            try:
+                created.extend(await collection.create_indexes([model]))
+            except Exception as e:
+                logger.error(f"Failed to create index {collection_name}.{model.document['name']}: {e}")
+
+        extra = [name for name in existing if name != "_id_" and name not in wanted]
+
+        for name in created:
+            logger.info(f"Created index {collection_name}.{name}")
+        for name in extra:
+            logger.warning(f"Index {collection_name}.{name} is not in the registry")
+        for name in conflicting:
+            logger.warning(f"Index {collection_name}.{name} keys differ from the registry")
+
+        report[collection_name] = {"created": created, "extra": extra, "conflicting": conflicting}
+    return report
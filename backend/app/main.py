@@ -3,6 +3,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from .config import settings
 from .database import connect_to_mongo, close_mongo_connection
+from .indexes import ensure_indexes
+from .services.http_client import open_http_client, close_http_client
+from .services.api_keys import api_key_resolver
+from .services.query_sketch import query_sketches
+from .services.rag_service import rag_service
+from .services.response_cache import response_cache
+from .services.tenant_index import tenant_indexes
+from .services.write_behind import chat_writer
 from .routes import clients, chat, analytics
 import logging
 
@@ -16,12 +24,23 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Prodesk Chatbot API...")
     await connect_to_mongo()
+    if settings.ensure_indexes_on_startup:
+        await ensure_indexes()
+    await open_http_client()
+    query_sketches.start()
+    chat_writer.start()
+    rag_service.start_watcher(settings.knowledge_reload_interval)
+    rag_service.start_vector_build()
     logger.info("Application started successfully")
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
+    await rag_service.stop_watcher()
+    await chat_writer.stop()
+    await query_sketches.stop()
+    await close_http_client()
     await close_mongo_connection()
     logger.info("Shutdown complete")
 
@@ -39,6 +58,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -60,6 +80,21 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """In-process cache and pipeline counters"""
+    return {
+        "response_cache": response_cache.stats(),
+        "api_keys": api_key_resolver.stats(),
+        "tenant_indexes": tenant_indexes.stats(),
+        "knowledge": {
+            "passages": len(rag_service.passages),
+            "vectors": len(rag_service.vectors) if rag_service.vectors is not None else 0,
+            **rag_service.ingest_report
+        },
+        "write_behind": chat_writer.stats()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,16 +1,19 @@
 from fastapi import Header, HTTPException, status
-from ..database import get_collection
+from typing import Dict
+from ..services.api_keys import api_key_resolver
 
-async def verify_api_key(api_key: str = Header(..., alias="X-API-Key")):
-    """Verify API key middleware"""
-    clients_collection = get_collection("clients")
-    
-    client = await clients_collection.find_one({"api_key": api_key, "is_active": True})
+async def resolve_client(api_key: str, detail: str = "Invalid or inactive API key") -> Dict:
+    """Resolve an API key to its active client or raise 401"""
+    client = await api_key_resolver.resolve(api_key)
     
     if not client:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or inactive API key"
+            detail=detail
         )
     
     return client
+
+async def verify_api_key(api_key: str = Header(..., alias="X-API-Key")):
+    """Verify API key middleware"""
+    return await resolve_client(api_key)
@@ -15,6 +15,9 @@ class ClientCreate(BaseModel):
     website_url: Optional[str] = None
     custom_knowledge: Optional[List[Dict[str, str]]] = []
 
+class KnowledgeUpdate(BaseModel):
+    custom_knowledge: List[Dict[str, str]] = []
+
 class ClientResponse(BaseModel):
     id: str = Field(alias="_id")
     name: str
@@ -71,13 +74,34 @@ class LeadResponse(BaseModel):
         populate_by_name = True
 
 # Analytics Models
+class LatencyStats(BaseModel):
+    count: int
+    mean_ms: Optional[float]
+    p50_ms: Optional[float]
+    p95_ms: Optional[float]
+    p99_ms: Optional[float]
+
 class AnalyticsResponse(BaseModel):
     total_chats: int
     leads_collected: int
-    avg_response_time: float
+    avg_response_time: float  # seconds, mean end-to-end chat latency
     top_queries: List[str]
     chats_today: int
     leads_today: int
+    latency: Dict[str, LatencyStats] = {}  # "total" plus one entry per stage
+
+class TimeSeriesPoint(BaseModel):
+    bucket: datetime
+    chats: int
+    messages: int
+    leads: int
+    avg_latency_ms: Optional[float]
+
+class TimeSeriesResponse(BaseModel):
+    granularity: str
+    start: datetime
+    end: datetime
+    points: List[TimeSeriesPoint]
 
 # Conversation Models
 class ConversationResponse(BaseModel):
@@ -85,6 +109,8 @@ class ConversationResponse(BaseModel):
     client_id: str
     session_id: str
     messages: List[Message]
+    message_count: int = 0
+    next_cursor: Optional[int] = None  # pass as `before` to load older messages
     lead_captured: Optional[Dict[str, Any]]
     created_at: datetime
     updated_at: datetime
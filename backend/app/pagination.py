@@ -0,0 +1,66 @@
+"""
+Keyset pagination on (created_at, _id), newest first
+Cursors are opaque URL-safe tokens encoding the last row's sort key
+"""
+from fastapi import HTTPException, status
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import base64
+import json
+
+SORT = [("created_at", -1), ("_id", -1)]
+
+
+def encode_cursor(doc: Dict) -> str:
+    raw = json.dumps({"t": doc["created_at"].isoformat(), "i": str(doc["_id"])})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, ObjectId]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(raw["t"]), ObjectId(raw["i"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def after_cursor(query: Dict, token: Optional[str]) -> Dict:
+    """Restrict a query to rows strictly after the cursor in SORT order"""
+    if not token:
+        return query
+    created_at, _id = decode_cursor(token)
+    keyset = {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": _id}},
+    ]}
+    return {"$and": [query, keyset]} if query else keyset
+
+
+def projection_for(fields: Optional[str], allowed: Iterable[str], default: Iterable[str]) -> Dict:
+    """Build a projection from a comma-separated `fields` parameter"""
+    allowed = set(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(default)
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    # The sort key is always needed to build the next cursor
+    return {field: 1 for field in set(requested) | {"created_at"}}
+
+
+async def fetch_page(collection, query: Dict, projection: Dict, limit: int, cursor: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+    """One page of documents plus the cursor for the next page (None at the end)"""
+    docs = await collection.find(after_cursor(query, cursor), projection).sort(SORT).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    docs = docs[:limit]
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return docs, next_cursor
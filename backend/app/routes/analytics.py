@@ -1,12 +1,34 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from ..models import AnalyticsResponse
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from ..models import AnalyticsResponse, TimeSeriesResponse
 from ..database import get_collection
 from ..middleware.auth import verify_api_key
-from datetime import datetime, timedelta
-from typing import Dict
+from ..pagination import fetch_page, projection_for
+from ..services import analytics_rollup, export
+from ..services.latency import LatencyHistogram
+from ..services.query_sketch import query_sketches
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+import asyncio
+import re
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
+MAX_TIMESERIES_BUCKETS = 2000
+LATENCY_WINDOW_DAYS = 7
+LEAD_FIELDS = ("client_id", "session_id", "name", "email", "phone", "message", "created_at")
+
+def _as_naive_utc(value: datetime) -> datetime:
+    """Stored timestamps are naive UTC"""
+    if value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _facet_count(facets: Dict, name: str) -> int:
+    """Read a {"$count": "n"} facet result"""
+    bucket = facets.get(name) or []
+    return bucket[0]["n"] if bucket else 0
+
 @router.get("/", response_model=AnalyticsResponse)
 async def get_analytics(client: Dict = Depends(verify_api_key)):
     """Get analytics for authenticated client"""
@@ -14,57 +36,164 @@ async def get_analytics(client: Dict = Depends(verify_api_key)):
     leads_collection = get_collection("leads")
     
     client_id = str(client["_id"])
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     
-    # Total chats
-    total_chats = await conversations_collection.count_documents({"client_id": client_id})
+    # Conversation counts are covered by the (client_id, created_at) index
+    conversations_pipeline = [
+        {"$match": {"client_id": client_id}},
+        {"$project": {"_id": 0, "created_at": 1}},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "today": [
+                {"$match": {"created_at": {"$gte": today_start}}},
+                {"$count": "n"}
+            ]
+        }}
+    ]
     
-    # Leads collected
-    leads_collected = await leads_collection.count_documents({"client_id": client_id})
+    # Lead counts are covered by the (client_id, created_at) index
+    leads_pipeline = [
+        {"$match": {"client_id": client_id}},
+        {"$project": {"_id": 0, "created_at": 1}},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "today": [
+                {"$match": {"created_at": {"$gte": today_start}}},
+                {"$count": "n"}
+            ]
+        }}
+    ]
     
-    # Chats today
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    chats_today = await conversations_collection.count_documents({
-        "client_id": client_id,
-        "created_at": {"$gte": today_start}
-    })
+    # Top queries come from the streaming sketch, which covers all traffic
+    conversation_facets, lead_facets, top_queries, latency = await asyncio.gather(
+        conversations_collection.aggregate(conversations_pipeline).to_list(length=1),
+        leads_collection.aggregate(leads_pipeline).to_list(length=1),
+        query_sketches.top(client_id, 5),
+        analytics_rollup.fetch_latency(client_id, datetime.utcnow() - timedelta(days=LATENCY_WINDOW_DAYS))
+    )
+    conversation_facets = conversation_facets[0] if conversation_facets else {}
+    lead_facets = lead_facets[0] if lead_facets else {}
+    total_latency = latency.get("total", LatencyHistogram())
     
-    # Leads today
-    leads_today = await leads_collection.count_documents({
-        "client_id": client_id,
-        "created_at": {"$gte": today_start}
-    })
+    return AnalyticsResponse(
+        total_chats=_facet_count(conversation_facets, "total"),
+        leads_collected=_facet_count(lead_facets, "total"),
+        avg_response_time=round((total_latency.mean() or 0.0) / 1000, 3),
+        top_queries=top_queries,
+        chats_today=_facet_count(conversation_facets, "today"),
+        leads_today=_facet_count(lead_facets, "today"),
+        latency={stage: histogram.summary() for stage, histogram in latency.items()}
+    )
+
+@router.get("/timeseries", response_model=TimeSeriesResponse)
+async def get_timeseries(
+    granularity: str = Query("hour", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    client: Dict = Depends(verify_api_key)
+):
+    """Chart data served from hourly/daily rollups"""
+    start = _as_naive_utc(start) if start else None
+    end = _as_naive_utc(end) if end else datetime.utcnow()
+    start = start or end - (timedelta(hours=24) if granularity == "hour" else timedelta(days=30))
     
-    # Top queries (extract user messages)
-    top_queries = []
-    async for conv in conversations_collection.find({"client_id": client_id}).limit(100):
-        for msg in conv.get("messages", []):
-            if msg.get("role") == "user":
-                top_queries.append(msg.get("content", ""))
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+    if (end - start) / analytics_rollup.GRANULARITIES[granularity] > MAX_TIMESERIES_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range exceeds {MAX_TIMESERIES_BUCKETS} {granularity} buckets"
+        )
     
-    # Get most common queries (simple approach)
-    from collections import Counter
-    query_counts = Counter(top_queries)
-    top_5_queries = [query for query, count in query_counts.most_common(5)]
+    points = await analytics_rollup.fetch_series(str(client["_id"]), granularity, start, end)
     
-    return AnalyticsResponse(
-        total_chats=total_chats,
-        leads_collected=leads_collected,
-        avg_response_time=2.5,  # Placeholder - implement actual calculation
-        top_queries=top_5_queries,
-        chats_today=chats_today,
-        leads_today=leads_today
+    return TimeSeriesResponse(
+        granularity=granularity,
+        start=start,
+        end=end,
+        points=points
     )
 
 @router.get("/leads")
-async def get_leads(client: Dict = Depends(verify_api_key)):
-    """Get all leads for authenticated client"""
+async def get_leads(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    email: Optional[str] = Query(None, description="Email prefix"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    client: Dict = Depends(verify_api_key)
+):
+    """Get leads for authenticated client, newest first; next page cursor in X-Next-Cursor"""
     leads_collection = get_collection("leads")
     
     client_id = str(client["_id"])
     
-    leads = []
-    async for lead in leads_collection.find({"client_id": client_id}).sort("created_at", -1):
-        lead["_id"] = str(lead["_id"])
-        leads.append(lead)
+    query = {"client_id": client_id}
+    created_range = {}
+    if created_after:
+        created_range["$gte"] = _as_naive_utc(created_after)
+    if created_before:
+        created_range["$lt"] = _as_naive_utc(created_before)
+    if created_range:
+        query["created_at"] = created_range
+    if email:
+        query["email"] = {"$regex": f"^{re.escape(email)}"}
+    
+    projection = projection_for(fields, LEAD_FIELDS, LEAD_FIELDS)
+    leads, next_cursor = await fetch_page(leads_collection, query, projection, limit, cursor)
     
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return leads
+
+def _export_response(rows, columns, fmt: str, compress: bool, name: str) -> StreamingResponse:
+    """Stream rows as NDJSON or CSV, optionally gzipped"""
+    if fmt == "csv":
+        body, media_type, extension = export.encode_csv(rows, columns), "text/csv", "csv"
+    else:
+        body, media_type, extension = export.encode_ndjson(rows, columns), "application/x-ndjson", "ndjson"
+    
+    filename = f"{name}-{datetime.utcnow():%Y%m%d}.{extension}"
+    if compress:
+        body, media_type, filename = export.gzip_stream(body), "application/gzip", filename + ".gz"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/leads/export")
+async def export_leads(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    client: Dict = Depends(verify_api_key)
+):
+    """Stream every lead for authenticated client as NDJSON or CSV"""
+    query = {"client_id": str(client["_id"])}
+    created_range = {}
+    if created_after:
+        created_range["$gte"] = _as_naive_utc(created_after)
+    if created_before:
+        created_range["$lt"] = _as_naive_utc(created_before)
+    if created_range:
+        query["created_at"] = created_range
+    
+    return _export_response(export.iter_leads(query), export.LEAD_COLUMNS, format, gzip, "leads")
+
+@router.get("/conversations/export")
+async def export_conversations(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    client: Dict = Depends(verify_api_key)
+):
+    """Stream every conversation message for authenticated client, one row per message"""
+    rows = export.iter_messages(str(client["_id"]))
+    return _export_response(rows, export.MESSAGE_COLUMNS, format, gzip, "conversations")
@@ -1,59 +1,55 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from ..models import ChatRequest, ChatResponse, Message, MessageRole, LeadCapture, LeadResponse
 from ..database import get_collection
+from ..middleware.auth import resolve_client
+from ..services import analytics_rollup, conversation_store
+from ..services.latency import StageTimer
+from ..services.query_sketch import query_sketches
 from ..services.rag_service import rag_service
+from ..services.tenant_index import tenant_indexes
+from ..services.write_behind import PendingTurn, chat_writer
 from datetime import datetime
 from bson import ObjectId
+from typing import Optional
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["chat"])
 
+async def save_turn(client_id: str, session_id: str, question: str, answer: str, timer: StageTimer):
+    """Queue a user/assistant exchange and its analytics for write-behind persistence"""
+    user_message = Message(role=MessageRole.USER, content=question)
+    assistant_message = Message(role=MessageRole.ASSISTANT, content=answer)
+    
+    await chat_writer.enqueue(PendingTurn(
+        client_id=client_id,
+        session_id=session_id,
+        messages=[user_message.dict(), assistant_message.dict()],
+        latency_ms=timer.total_ms(),
+        stages=dict(timer.stages)
+    ))
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Handle chat message"""
-    clients_collection = get_collection("clients")
-    conversations_collection = get_collection("conversations")
+    timer = StageTimer()
     
     # Verify API key
-    client = await clients_collection.find_one({"api_key": request.api_key, "is_active": True})
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid API key"
-        )
+    with timer.stage("auth"):
+        client = await resolve_client(request.api_key, detail="Invalid API key")
+    client_id = str(client["_id"])
+    query_sketches.record(client_id, request.message)
+    with timer.stage("tenant_index"):
+        tenant = await tenant_indexes.get(client)
     
     # Query RAG system
-    result = await rag_service.get_response(request.message)
+    result = await rag_service.get_response(request.message, client_id=client_id, timer=timer, tenant=tenant)
     
-    # Save conversation
-    user_message = Message(role=MessageRole.USER, content=request.message)
-    assistant_message = Message(role=MessageRole.ASSISTANT, content=result)
-    
-    await conversations_collection.update_one(
-        {
-            "client_id": str(client["_id"]),
-            "session_id": request.session_id
-        },
-        {
-            "$push": {
-                "messages": {
-                    "$each": [
-                        user_message.dict(),
-                        assistant_message.dict()
-                    ]
-                }
-            },
-            "$set": {
-                "updated_at": datetime.utcnow()
-            },
-            "$setOnInsert": {
-                "created_at": datetime.utcnow(),
-                "client_id": str(client["_id"]),
-                "session_id": request.session_id,
-                "lead_captured": None
-            }
-        },
-        upsert=True
-    )
+    # Save conversation (flushed in the background)
+    await save_turn(client_id, request.session_id, request.message, result, timer)
     
     return ChatResponse(
         answer=result,
@@ -61,20 +57,50 @@ async def chat(request: ChatRequest):
         session_id=request.session_id
     )
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Stream the answer as Server-Sent Events, then save the conversation"""
+    timer = StageTimer()
+    
+    # Verify API key
+    with timer.stage("auth"):
+        client = await resolve_client(request.api_key, detail="Invalid API key")
+    client_id = str(client["_id"])
+    query_sketches.record(client_id, request.message)
+    with timer.stage("tenant_index"):
+        tenant = await tenant_indexes.get(client)
+    
+    async def event_stream():
+        parts = []
+        try:
+            async for token in rag_service.stream_response(request.message, client_id=client_id, timer=timer, tenant=tenant):
+                parts.append(token)
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except Exception as e:
+            logger.error(f"Chat stream failed: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Failed to generate a response'})}\n\n"
+        
+        # Persist once the full answer is known; the client always gets done
+        try:
+            await save_turn(client_id, request.session_id, request.message, "".join(parts), timer)
+        except Exception as e:
+            logger.error(f"Failed to save chat turn: {e}")
+        yield f"event: done\ndata: {json.dumps({'session_id': request.session_id})}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/leads", response_model=LeadResponse, status_code=status.HTTP_201_CREATED)
 async def capture_lead(lead_data: LeadCapture):
     """Capture lead information"""
-    clients_collection = get_collection("clients")
     conversations_collection = get_collection("conversations")
     leads_collection = get_collection("leads")
     
     # Verify API key
-    client = await clients_collection.find_one({"api_key": lead_data.api_key, "is_active": True})
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid API key"
-        )
+    client = await resolve_client(lead_data.api_key, detail="Invalid API key")
     
     # Create lead document
     lead_doc = {
@@ -90,7 +116,10 @@ async def capture_lead(lead_data: LeadCapture):
     result = await leads_collection.insert_one(lead_doc)
     lead_doc["_id"] = str(result.inserted_id)
     
-    # Update conversation with lead info
+    await analytics_rollup.record(str(client["_id"]), leads=1, at=lead_doc["created_at"])
+    
+    # Attach the lead to an existing conversation only; a lead alone is not a
+    # chat. If the session's first turn is still queued, the lead stays in leads.
     await conversations_collection.update_one(
         {
             "client_id": str(client["_id"]),
@@ -110,23 +139,17 @@ async def capture_lead(lead_data: LeadCapture):
     return LeadResponse(**lead_doc)
 
 @router.get("/conversations/{session_id}")
-async def get_conversation(session_id: str, api_key: str):
-    """Get conversation by session ID"""
-    clients_collection = get_collection("clients")
-    conversations_collection = get_collection("conversations")
-    
+async def get_conversation(
+    session_id: str,
+    api_key: str,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[int] = Query(None, ge=0, description="Cursor from a previous page's next_cursor")
+):
+    """Get conversation by session ID with its latest messages"""
     # Verify API key
-    client = await clients_collection.find_one({"api_key": api_key, "is_active": True})
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid API key"
-        )
+    client = await resolve_client(api_key, detail="Invalid API key")
     
-    conversation = await conversations_collection.find_one({
-        "client_id": str(client["_id"]),
-        "session_id": session_id
-    })
+    conversation = await conversation_store.get_header(str(client["_id"]), session_id)
     
     if not conversation:
         raise HTTPException(
@@ -134,5 +157,10 @@ async def get_conversation(session_id: str, api_key: str):
             detail="Conversation not found"
         )
     
+    messages, next_cursor = await conversation_store.load_messages(conversation, limit, before)
+    
     conversation["_id"] = str(conversation["_id"])
+    conversation.pop("legacy_count", None)
+    conversation["messages"] = messages
+    conversation["next_cursor"] = next_cursor
     return conversation
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException, status
-from ..models import ClientCreate, ClientResponse, ThemeConfig
+from fastapi import APIRouter, HTTPException, status, Query, Response
+from ..models import ClientCreate, ClientResponse, KnowledgeUpdate, ThemeConfig
 from ..database import get_collection
+from ..pagination import fetch_page, projection_for
+from ..services.api_keys import api_key_resolver
+from ..services.knowledge_index import knowledge_hash
 from datetime import datetime
 import secrets
-from typing import List
+from typing import Optional
 
 router = APIRouter(prefix="/api/clients", tags=["clients"])
 
+CLIENT_FIELDS = ("name", "email", "api_key", "website_url", "theme", "is_active", "created_at")
+
 @router.post("/", response_model=ClientResponse, status_code=status.HTTP_201_CREATED)
 async def create_client(client_data: ClientCreate):
     """Create a new client"""
@@ -30,8 +35,10 @@ async def create_client(client_data: ClientCreate):
         "api_key": api_key,
         "website_url": client_data.website_url,
         "custom_knowledge": client_data.custom_knowledge or [],
+        "knowledge_hash": knowledge_hash(client_data.custom_knowledge or []),
         "theme": ThemeConfig().dict(),
         "is_active": True,
+        "key_version": 0,
         "created_at": datetime.utcnow()
     }
     
@@ -40,16 +47,22 @@ async def create_client(client_data: ClientCreate):
     
     return ClientResponse(**client_doc)
 
-@router.get("/", response_model=List[ClientResponse])
-async def list_clients():
-    """List all clients"""
+@router.get("/")
+async def list_clients(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return")
+):
+    """List clients, newest first; next page cursor in X-Next-Cursor"""
     clients_collection = get_collection("clients")
     
-    clients = []
-    async for client in clients_collection.find():
-        client["_id"] = str(client["_id"])
-        clients.append(ClientResponse(**client))
+    # custom_knowledge can be large and is only returned when asked for
+    projection = projection_for(fields, CLIENT_FIELDS + ("custom_knowledge",), CLIENT_FIELDS)
+    clients, next_cursor = await fetch_page(clients_collection, {}, projection, limit, cursor)
     
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return clients
 
 @router.get("/{client_id}", response_model=ClientResponse)
@@ -76,7 +89,7 @@ async def update_client_theme(client_id: str, theme: ThemeConfig):
     
     result = await clients_collection.update_one(
         {"_id": ObjectId(client_id)},
-        {"$set": {"theme": theme.dict()}}
+        {"$set": {"theme": theme.dict()}, "$inc": {"key_version": 1}}
     )
     
     if result.modified_count == 0:
@@ -85,8 +98,35 @@ async def update_client_theme(client_id: str, theme: ThemeConfig):
             detail="Client not found"
         )
     
+    api_key_resolver.invalidate_client(client_id)
+    
     return {"message": "Theme updated successfully"}
 
+@router.put("/{client_id}/knowledge")
+async def update_client_knowledge(client_id: str, knowledge: KnowledgeUpdate):
+    """Replace a client's custom knowledge; its index is rebuilt on the next chat"""
+    from bson import ObjectId
+    clients_collection = get_collection("clients")
+    
+    result = await clients_collection.update_one(
+        {"_id": ObjectId(client_id)},
+        {"$set": {
+            "custom_knowledge": knowledge.custom_knowledge,
+            "knowledge_hash": knowledge_hash(knowledge.custom_knowledge)
+        }, "$inc": {"key_version": 1}}
+    )
+    
+    if result.matched_count == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Client not found"
+        )
+    
+    # The cached client carries knowledge_hash, which tells workers to rebuild
+    api_key_resolver.invalidate_client(client_id)
+    
+    return {"message": "Knowledge updated successfully", "entries": len(knowledge.custom_knowledge)}
+
 @router.delete("/{client_id}")
 async def deactivate_client(client_id: str):
     """Deactivate a client"""
@@ -95,7 +135,7 @@ async def deactivate_client(client_id: str):
     
     result = await clients_collection.update_one(
         {"_id": ObjectId(client_id)},
-        {"$set": {"is_active": False}}
+        {"$set": {"is_active": False}, "$inc": {"key_version": 1}}
     )
     
     if result.modified_count == 0:
@@ -104,4 +144,6 @@ async def deactivate_client(client_id: str):
             detail="Client not found"
         )
     
+    api_key_resolver.invalidate_client(client_id)
+    
     return {"message": "Client deactivated successfully"}
@@ -0,0 +1,150 @@
+"""
+Write-time analytics rollups
+Per-tenant hourly and daily counters maintained with upsert $inc
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from pymongo import UpdateOne
+from ..database import get_collection
+from .latency import LatencyHistogram
+import logging
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+COUNTERS = ("chats", "messages", "leads", "latency_ms_sum", "latency_count")
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its bucket"""
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rollup_updates(client_id: str, increments: Dict[str, float], at: datetime) -> List[UpdateOne]:
+    """One upsert per granularity for a set of counter increments"""
+    return [
+        UpdateOne(
+            {"client_id": client_id, "granularity": granularity, "bucket": bucket_start(at, granularity)},
+            {"$inc": increments},
+            upsert=True
+        )
+        for granularity in GRANULARITIES
+    ]
+
+
+def build_increments(
+    chats: int = 0,
+    messages: int = 0,
+    leads: int = 0,
+    latency_ms: Optional[float] = None,
+    stages: Optional[Dict[str, float]] = None,
+) -> Dict[str, float]:
+    """$inc document for one event"""
+    increments = {}
+    if chats:
+        increments["chats"] = chats
+    if messages:
+        increments["messages"] = messages
+    if leads:
+        increments["leads"] = leads
+    if latency_ms is not None:
+        increments["latency_ms_sum"] = latency_ms
+        increments["latency_count"] = 1
+        increments.update(LatencyHistogram.increments("latency.total", latency_ms))
+    for stage, ms in (stages or {}).items():
+        increments.update(LatencyHistogram.increments(f"latency.{stage}", ms))
+    return increments
+
+
+def merged_updates(events: Iterable[Tuple[str, Dict[str, float], datetime]]) -> List[UpdateOne]:
+    """Sum (client_id, increments, at) events that land in the same buckets"""
+    merged: Dict[Tuple[str, str, datetime], Dict[str, float]] = {}
+    for client_id, increments, at in events:
+        for granularity in GRANULARITIES:
+            target = merged.setdefault((client_id, granularity, bucket_start(at, granularity)), {})
+            for field, value in increments.items():
+                target[field] = target.get(field, 0) + value
+    return [
+        UpdateOne(
+            {"client_id": client_id, "granularity": granularity, "bucket": bucket},
+            {"$inc": increments},
+            upsert=True
+        )
+        for (client_id, granularity, bucket), increments in merged.items()
+        if increments
+    ]
+
+
+async def record(
+    client_id: str,
+    chats: int = 0,
+    messages: int = 0,
+    leads: int = 0,
+    latency_ms: Optional[float] = None,
+    stages: Optional[Dict[str, float]] = None,
+    at: Optional[datetime] = None,
+):
+    """Increment rollup counters; failures are logged, never raised"""
+    collection = get_collection("analytics_rollups")
+    if collection is None:
+        return
+
+    increments = build_increments(chats, messages, leads, latency_ms, stages)
+    if not increments:
+        return
+
+    try:
+        await collection.bulk_write(rollup_updates(client_id, increments, at or datetime.utcnow()), ordered=False)
+    except Exception as e:
+        logger.warning(f"Analytics rollup update failed: {e}")
+
+
+async def fetch_latency(client_id: str, since: datetime) -> Dict[str, LatencyHistogram]:
+    """Per-stage histograms merged across daily rollups since a time"""
+    collection = get_collection("analytics_rollups")
+    histograms: Dict[str, LatencyHistogram] = {}
+    cursor = collection.find(
+        {"client_id": client_id, "granularity": "day", "bucket": {"$gte": bucket_start(since, "day")}},
+        {"_id": 0, "latency": 1}
+    )
+    async for doc in cursor:
+        for stage, stage_doc in doc.get("latency", {}).items():
+            histograms.setdefault(stage, LatencyHistogram()).merge(LatencyHistogram.from_doc(stage_doc))
+    return histograms
+
+
+async def fetch_series(client_id: str, granularity: str, start: datetime, end: datetime) -> List[Dict]:
+    """Rollup points for [start, end], with empty buckets filled as zeros"""
+    collection = get_collection("analytics_rollups")
+    first = bucket_start(start, granularity)
+    last = bucket_start(end, granularity)
+
+    found = {}
+    cursor = collection.find(
+        {"client_id": client_id, "granularity": granularity, "bucket": {"$gte": first, "$lte": last}},
+        {"_id": 0, "bucket": 1, **{name: 1 for name in COUNTERS}}
+    )
+    async for doc in cursor:
+        found[doc["bucket"]] = doc
+
+    points = []
+    step = GRANULARITIES[granularity]
+    bucket = first
+    while bucket <= last:
+        doc = found.get(bucket, {})
+        latency_count = doc.get("latency_count", 0)
+        points.append({
+            "bucket": bucket,
+            "chats": doc.get("chats", 0),
+            "messages": doc.get("messages", 0),
+            "leads": doc.get("leads", 0),
+            "avg_latency_ms": (doc.get("latency_ms_sum", 0) / latency_count) if latency_count else None,
+        })
+        bucket += step
+    return points
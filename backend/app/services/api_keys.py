@@ -0,0 +1,134 @@
+"""
+API key -> client resolution with an in-process TTL cache
+Shared by the X-API-Key dependency and the widget chat routes
+
+Each worker has its own cache. Client writes bump `key_version`, and a
+cached client is re-checked against it with a point read on _id every
+`version_ttl` seconds, so a change made through any worker is seen by
+every worker within that window.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from ..config import settings
+from ..database import get_collection
+
+logger = logging.getLogger(__name__)
+
+class ApiKeyResolver:
+    def __init__(self, ttl: float = 60, negative_ttl: float = 10, version_ttl: float = 5, max_entries: int = 10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.version_ttl = version_ttl
+        self.max_entries = max_entries
+        # api_key -> (expires_at, checked_until, client doc or None for unknown/inactive keys)
+        self._entries: "OrderedDict[str, Tuple[float, float, Optional[Dict]]]" = OrderedDict()
+        self._keys_by_client: Dict[str, str] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    async def resolve(self, api_key: str) -> Optional[Dict]:
+        """Return the active client for api_key, or None"""
+        now = time.monotonic()
+        entry = self._entries.get(api_key)
+        cached = None
+        if entry is not None and entry[0] > now:
+            if entry[1] > now:
+                self._entries.move_to_end(api_key)
+                self.hits += 1
+                return entry[2]
+            cached = entry[2]
+
+        # Collapse concurrent misses and version checks for the same key into one query
+        pending = self._inflight.get(api_key)
+        if pending is not None:
+            return await pending
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[api_key] = future
+        try:
+            client = await self._lookup(api_key, cached)
+            future.set_result(client)
+            return client
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark retrieved to avoid "never retrieved" warnings
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(api_key, None)
+
+    async def _lookup(self, api_key: str, cached: Optional[Dict]) -> Optional[Dict]:
+        clients_collection = get_collection("clients")
+        if cached is not None:
+            # Unchanged since it was cached if the key, status and version still match
+            current = await clients_collection.find_one(
+                {
+                    "_id": cached["_id"],
+                    "api_key": api_key,
+                    "is_active": True,
+                    "key_version": cached.get("key_version"),
+                },
+                {"_id": 1}
+            )
+            if current is not None:
+                self.revalidations += 1
+                entry = self._entries.get(api_key)
+                if entry is not None and entry[2] is cached:
+                    self._entries[api_key] = (entry[0], time.monotonic() + self.version_ttl, cached)
+                    self._entries.move_to_end(api_key)
+                return cached
+
+        self.misses += 1
+        # custom_knowledge can be large; tenant indexes load it on demand
+        client = await clients_collection.find_one(
+            {"api_key": api_key, "is_active": True},
+            {"custom_knowledge": 0}
+        )
+        self._store(api_key, client)
+        return client
+
+    def _store(self, api_key: str, client: Optional[Dict]):
+        now = time.monotonic()
+        ttl = self.ttl if client else self.negative_ttl
+        # Unknown keys have no version to re-check; they simply expire
+        checked_until = now + min(ttl, self.version_ttl) if client else now + ttl
+        self._entries[api_key] = (now + ttl, checked_until, client)
+        self._entries.move_to_end(api_key)
+        if client:
+            self._keys_by_client[str(client["_id"])] = api_key
+        while len(self._entries) > self.max_entries:
+            evicted_key, (_, _, evicted) = self._entries.popitem(last=False)
+            if evicted:
+                self._keys_by_client.pop(str(evicted["_id"]), None)
+
+    def invalidate(self, api_key: str):
+        entry = self._entries.pop(api_key, None)
+        if entry and entry[2]:
+            self._keys_by_client.pop(str(entry[2]["_id"]), None)
+
+    def invalidate_client(self, client_id: str):
+        """Drop this worker's cached entry for a client; others notice the bumped key_version"""
+        api_key = self._keys_by_client.pop(client_id, None)
+        if api_key is not None:
+            self._entries.pop(api_key, None)
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+        }
+
+
+api_key_resolver = ApiKeyResolver(
+    ttl=settings.api_key_cache_ttl,
+    negative_ttl=settings.api_key_negative_ttl,
+    version_ttl=settings.api_key_version_ttl,
+    max_entries=settings.api_key_cache_max_entries,
+)
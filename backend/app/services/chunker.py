@@ -0,0 +1,101 @@
+"""
+Passage chunking for scraped pages
+Splits page content into overlapping sentence windows for retrieval
+"""
+import re
+from typing import Dict, Iterable, List, Tuple
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+WORD_RE = re.compile(r"\S+")
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Return (start, end) character spans of sentences in text"""
+    spans = []
+    start = 0
+    for match in SENTENCE_END_RE.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return [(s, e) for s, e in spans if e > s]
+
+
+def _word_spans(text: str, start: int, end: int) -> List[Tuple[int, int]]:
+    return [m.span() for m in WORD_RE.finditer(text, start, end)]
+
+
+def chunk_text(text: str, max_words: int = 80, overlap_words: int = 20) -> List[Tuple[int, int]]:
+    """
+    Pack whole sentences into windows of at most max_words words.
+
+    Consecutive windows share roughly overlap_words words so an answer that
+    straddles a boundary is still retrievable. Sentences longer than a window
+    (menus, run-on text without punctuation) are split on word boundaries.
+    Returns (start, end) character offsets into text.
+    """
+    overlap_words = min(overlap_words, max_words // 2)
+
+    # Flatten into word spans, remembering where sentences start
+    words: List[Tuple[int, int]] = []
+    sentence_starts = set()
+    for s_start, s_end in split_sentences(text):
+        sentence_starts.add(len(words))
+        words.extend(_word_spans(text, s_start, s_end))
+
+    chunks = []
+    i = 0
+    while i < len(words):
+        end = min(i + max_words, len(words))
+        # Prefer to end on a sentence boundary if one falls in the back half
+        if end < len(words):
+            for j in range(end, i + max_words // 2, -1):
+                if j in sentence_starts:
+                    end = j
+                    break
+        chunks.append((words[i][0], words[end - 1][1]))
+        if end >= len(words):
+            break
+
+        # Step back for overlap, snapping forward to a sentence start if close
+        next_i = max(end - overlap_words, i + 1)
+        for j in range(next_i, end):
+            if j in sentence_starts:
+                next_i = j
+                break
+        i = next_i
+    return chunks
+
+
+def chunk_documents(entries: Iterable[Dict], max_words: int = 80, overlap_words: int = 20) -> List[Dict]:
+    """Turn knowledge entries into passages carrying source URL and offsets"""
+    passages = []
+    for page_index, entry in enumerate(entries):
+        content = entry.get('content', '')
+        for chunk_index, (start, end) in enumerate(chunk_text(content, max_words, overlap_words)):
+            passages.append({
+                "url": entry.get('url', ''),
+                "source": entry.get('source', ''),
+                "content": content[start:end],
+                "page_index": page_index,
+                "chunk_index": chunk_index,
+                "start": start,
+                "end": end,
+            })
+    return passages
+
+
+def build_context(passages: Iterable[Dict], max_chars: int = 800) -> str:
+    """Join whole passages, best first, until the character budget is spent"""
+    parts = []
+    used = 0
+    for passage in passages:
+        content = passage.get('content', '')
+        sep = 2 if parts else 0
+        if used + sep + len(content) > max_chars:
+            if not parts:
+                parts.append(content[:max_chars])
+            break
+        parts.append(content)
+        used += sep + len(content)
+    return "\n\n".join(parts)
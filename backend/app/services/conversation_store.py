@@ -0,0 +1,157 @@
+"""
+Bucketed conversation storage
+A header document per session in `conversations` keeps counts and timestamps;
+messages live in fixed-size pages in `conversation_messages`.
+"""
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from typing import Dict, List, Optional, Tuple
+from ..config import settings
+from ..database import get_collection
+
+HEADER_PROJECTION = {
+    "client_id": 1,
+    "session_id": 1,
+    "message_count": 1,
+    "page_size": 1,
+    "lead_captured": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    # Sessions written before bucketing keep their messages inline
+    "legacy_count": {"$size": {"$ifNull": ["$messages", []]}},
+}
+
+
+async def reserve_sequences(client_id: str, session_id: str, n: int, now: datetime) -> Tuple[int, int]:
+    """
+    Atomically claim n sequence numbers for a session, creating its header.
+
+    Returns (first sequence number, page size). Legacy sessions start
+    counting after their inline messages.
+    """
+    conversations_collection = get_collection("conversations")
+    # The header is unique per session; an upsert that loses the insert race
+    # to another worker fails once, and the retry matches the winner's header
+    for attempt in range(2):
+        try:
+            header = await conversations_collection.find_one_and_update(
+                {"client_id": client_id, "session_id": session_id},
+                [{"$set": {
+                    "client_id": client_id,
+                    "session_id": session_id,
+                    "message_count": {"$add": [
+                        {"$ifNull": ["$message_count", {"$size": {"$ifNull": ["$messages", []]}}]},
+                        n
+                    ]},
+                    "page_size": {"$ifNull": ["$page_size", settings.conversation_page_size]},
+                    "lead_captured": {"$ifNull": ["$lead_captured", None]},
+                    "created_at": {"$ifNull": ["$created_at", now]},
+                    "updated_at": now,
+                }}],
+                projection={"_id": 0, "message_count": 1, "page_size": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return header["message_count"] - n, header["page_size"]
+        except DuplicateKeyError:
+            if attempt:
+                raise
+
+
+def page_updates(
+    client_id: str,
+    session_id: str,
+    messages: List[Dict],
+    first_seq: int,
+    page_size: int,
+    now: datetime
+) -> List[UpdateOne]:
+    """
+    Upserts adding each message to the page holding its sequence number.
+
+    Messages whose seq is already on the page are skipped, so replaying the
+    same updates after a failed or partial bulk_write writes nothing twice.
+    """
+    by_page: Dict[int, List[Dict]] = {}
+    for offset, message in enumerate(messages):
+        seq = first_seq + offset
+        by_page.setdefault(seq // page_size, []).append({**message, "seq": seq})
+
+    return [
+        UpdateOne(
+            {"client_id": client_id, "session_id": session_id, "page": page},
+            [
+                {"$set": {
+                    "messages": {"$concatArrays": [
+                        {"$ifNull": ["$messages", []]},
+                        {"$filter": {
+                            # $literal keeps message text starting with "$" from being read as a field path
+                            "input": {"$literal": page_messages},
+                            "cond": {"$not": [{"$in": ["$$this.seq", {"$ifNull": ["$messages.seq", []]}]}]}
+                        }}
+                    ]},
+                    "created_at": {"$ifNull": ["$created_at", now]}
+                }},
+                {"$set": {"count": {"$size": "$messages"}}}
+            ],
+            upsert=True
+        )
+        for page, page_messages in by_page.items()
+    ]
+
+
+async def get_header(client_id: str, session_id: str) -> Optional[Dict]:
+    """Session header without any message bodies"""
+    conversations_collection = get_collection("conversations")
+    header = await conversations_collection.find_one(
+        {"client_id": client_id, "session_id": session_id},
+        HEADER_PROJECTION
+    )
+    if header is not None and "message_count" not in header:
+        header["message_count"] = header["legacy_count"]
+    return header
+
+
+async def load_messages(header: Dict, limit: int, before: Optional[int] = None) -> Tuple[List[Dict], Optional[int]]:
+    """
+    Load up to `limit` messages with seq < before (default: the latest).
+
+    Returns (messages oldest first, cursor for the previous page or None).
+    """
+    client_id = header["client_id"]
+    session_id = header["session_id"]
+    total = header["message_count"]
+    legacy_count = header.get("legacy_count", 0)
+    page_size = header.get("page_size") or settings.conversation_page_size
+
+    end = total if before is None else max(0, min(before, total))
+    start = max(0, end - limit)
+    messages: List[Dict] = []
+
+    if start < min(end, legacy_count):
+        conversations_collection = get_collection("conversations")
+        legacy_end = min(end, legacy_count)
+        doc = await conversations_collection.find_one(
+            {"_id": header["_id"]},
+            {"messages": {"$slice": [start, legacy_end - start]}}
+        )
+        for offset, message in enumerate(doc.get("messages", [])):
+            messages.append({**message, "seq": start + offset})
+
+    paged_start = max(start, legacy_count)
+    if paged_start < end:
+        pages_collection = get_collection("conversation_messages")
+        cursor = pages_collection.find(
+            {
+                "client_id": client_id,
+                "session_id": session_id,
+                "page": {"$gte": paged_start // page_size, "$lte": (end - 1) // page_size}
+            },
+            {"_id": 0, "messages": 1}
+        )
+        async for page in cursor:
+            messages.extend(m for m in page["messages"] if paged_start <= m["seq"] < end)
+
+    messages.sort(key=lambda m: m["seq"])
+    return messages, (start if start > 0 else None)
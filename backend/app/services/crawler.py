@@ -0,0 +1,306 @@
+"""
+Same-site crawler feeding the scrapers
+Seeds from the base URL and sitemap.xml, follows links breadth-first with a
+deduplicated frontier, and yields pages as they are fetched.
+"""
+import asyncio
+import json
+import logging
+import os
+import posixpath
+from collections import deque
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from xml.etree import ElementTree
+import lxml.html
+from lxml.etree import ParserError
+from .fetcher import Fetcher, FetchResult
+
+logger = logging.getLogger(__name__)
+
+TRACKING_PARAMS = frozenset({"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "ref"})
+
+SKIP_EXTENSIONS = frozenset({
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".css", ".js",
+    ".zip", ".gz", ".mp3", ".mp4", ".mov", ".avi", ".woff", ".woff2", ".ttf", ".xml", ".json",
+})
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize(url: str) -> Optional[str]:
+    """
+    Normalize a URL so equivalent spellings dedupe to one frontier entry.
+
+    Lowercases scheme and host, drops default ports, fragments and tracking
+    parameters, resolves dot segments and sorts the query. Returns None for
+    anything that is not http(s).
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower()
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{parts.port}"
+
+    path = parts.path or "/"
+    trailing = path.endswith("/")
+    path = posixpath.normpath(path)
+    if path == ".":
+        path = "/"
+    if trailing and not path.endswith("/"):
+        path += "/"
+    if path.startswith("//"):
+        path = "/" + path.lstrip("/")
+
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def site_of(url: str) -> str:
+    """Host used for same-domain scoping; a leading www. is ignored"""
+    host = urlsplit(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def extract_links(url: str, content: bytes) -> List[str]:
+    """Canonical absolute links of a page, in document order"""
+    try:
+        doc = lxml.html.fromstring(content)
+    except (ParserError, ValueError):
+        return []
+
+    base = url
+    base_href = doc.find(".//base[@href]")
+    if base_href is not None:
+        base = urljoin(url, base_href.get("href"))
+
+    links = []
+    for anchor in doc.iter("a"):
+        href = anchor.get("href")
+        if not href or "nofollow" in (anchor.get("rel") or "").lower().split():
+            continue
+        canonical = canonicalize(urljoin(base, href))
+        if canonical is None:
+            continue
+        if posixpath.splitext(urlsplit(canonical).path)[1].lower() in SKIP_EXTENSIONS:
+            continue
+        links.append(canonical)
+    return list(dict.fromkeys(links))
+
+
+def parse_sitemap(content: bytes) -> Tuple[List[str], List[str]]:
+    """(page URLs, nested sitemap URLs) from a sitemap or sitemap index"""
+    try:
+        root = ElementTree.fromstring(content)
+    except ElementTree.ParseError:
+        return [], []
+    locs = [e.text.strip() for e in root.iter() if e.tag.endswith("loc") and e.text]
+    if root.tag.endswith("sitemapindex"):
+        return [], locs
+    return locs, []
+
+
+@dataclass
+class CrawledPage:
+    url: str
+    depth: int
+    result: FetchResult
+    links: List[str] = field(default_factory=list)
+    is_html: bool = False
+
+
+class Crawler:
+    """
+    Breadth-first crawl of one site.
+
+    `previous_links` maps URLs from an earlier run to their outlinks, so pages
+    that come back unchanged (304) are still expanded without a re-download.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        fetcher: Fetcher,
+        max_pages: int = 200,
+        max_depth: int = 3,
+        concurrency: int = 8,
+        same_domain: bool = True,
+        use_sitemap: bool = True,
+        previous_links: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.base_url = canonicalize(base_url)
+        self.fetcher = fetcher
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.same_domain = same_domain
+        self.use_sitemap = use_sitemap
+        self.previous_links = previous_links or {}
+        self.site = site_of(self.base_url)
+        self._frontier: Deque[Tuple[str, int]] = deque()
+        self._seen: Set[str] = set()
+        self._fetched: Set[str] = set()
+
+    def in_scope(self, url: str) -> bool:
+        return not self.same_domain or site_of(url) == self.site
+
+    def _enqueue(self, url: str, depth: int):
+        canonical = canonicalize(url)
+        if canonical is None or canonical in self._seen or not self.in_scope(canonical):
+            return
+        self._seen.add(canonical)
+        self._frontier.append((canonical, depth))
+
+    async def _sitemap_urls(self, max_sitemaps: int = 20) -> List[str]:
+        pending = [urljoin(self.base_url, "/sitemap.xml")]
+        visited: Set[str] = set()
+        urls: List[str] = []
+        while pending and len(visited) < max_sitemaps and len(urls) < self.max_pages:
+            sitemap_url = pending.pop()
+            if sitemap_url in visited:
+                continue
+            visited.add(sitemap_url)
+            result = await self.fetcher.fetch(sitemap_url, conditional=False)
+            if not result.ok or not result.content:
+                continue
+            pages, nested = parse_sitemap(result.content)
+            urls.extend(pages)
+            pending.extend(nested)
+        return urls
+
+    async def _fetch(self, url: str, depth: int) -> CrawledPage:
+        result = await self.fetcher.fetch(url, conditional=url in self.previous_links)
+        page = CrawledPage(url=url, depth=depth, result=result)
+        if result.unchanged:
+            page.is_html = True
+            page.links = self.previous_links.get(url, [])
+        elif result.content and "html" in result.headers.get("content-type", "text/html"):
+            page.is_html = True
+            page.links = extract_links(result.final_url or url, result.content)
+        return page
+
+    async def crawl(self) -> AsyncIterator[CrawledPage]:
+        """Yield pages as they are fetched, until the frontier or page budget runs out"""
+        self._enqueue(self.base_url, 0)
+        if self.use_sitemap:
+            for url in await self._sitemap_urls():
+                self._enqueue(url, 1)
+
+        scheduled = 0
+        in_flight: Set[asyncio.Task] = set()
+        try:
+            while self._frontier or in_flight:
+                while self._frontier and len(in_flight) < self.concurrency and scheduled < self.max_pages:
+                    url, depth = self._frontier.popleft()
+                    in_flight.add(asyncio.create_task(self._fetch(url, depth)))
+                    scheduled += 1
+                if not in_flight:
+                    break
+
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    page = task.result()
+                    # Redirect targets count as seen so they are not fetched or emitted twice
+                    final = canonicalize(page.result.final_url or page.url) or page.url
+                    self._seen.add(final)
+                    if final in self._fetched:
+                        continue
+                    self._fetched.add(final)
+                    if page.depth < self.max_depth:
+                        for link in page.links:
+                            self._enqueue(link, page.depth + 1)
+                    yield page
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+        logger.info(f"Crawl of {self.base_url} finished: {scheduled} pages fetched, {len(self._frontier)} left in frontier")
+
+
+class JsonArrayWriter:
+    """Write a JSON array one item at a time, replacing the file only on success"""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.count = 0
+        self._tmp = f"{filepath}.tmp"
+        self._file = None
+
+    def __enter__(self) -> "JsonArrayWriter":
+        directory = os.path.dirname(self.filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self._tmp, "w", encoding="utf-8")
+        self._file.write("[")
+        return self
+
+    def write(self, item: Dict):
+        self._file.write(",\n" if self.count else "\n")
+        self._file.write(json.dumps(item, ensure_ascii=False))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.write("\n]\n")
+        self._file.close()
+        if exc_type is None:
+            os.replace(self._tmp, self.filepath)
+        else:
+            os.remove(self._tmp)
+
+
+async def crawl_site(
+    base_url: str,
+    parse_page: Callable[[str, bytes], Dict],
+    filepath: str,
+    previous: Optional[List[Dict]] = None,
+    state_path: Optional[str] = None,
+    max_pages: int = 200,
+    max_depth: int = 3,
+    fetch_options: Optional[Dict] = None,
+    executor: Optional[Executor] = None,
+) -> int:
+    """
+    Crawl a site and stream parsed pages into a JSON array at `filepath`.
+
+    Unchanged pages reuse their entry from `previous`. Each entry records its
+    outlinks so the next run can expand unchanged pages. With an `executor`
+    (e.g. a process pool), parsing runs there while fetching continues.
+    Returns pages written.
+    """
+    loop = asyncio.get_running_loop()
+    previous_by_url = {page["url"]: page for page in previous or [] if page.get("content")}
+    previous_links = {url: page.get("links", []) for url, page in previous_by_url.items()}
+
+    async with Fetcher(state_path=state_path, **(fetch_options or {})) as fetcher:
+        crawler = Crawler(
+            base_url,
+            fetcher,
+            max_pages=max_pages,
+            max_depth=max_depth,
+            previous_links=previous_links,
+        )
+        with JsonArrayWriter(filepath) as out:
+            async for page in crawler.crawl():
+                if page.result.unchanged:
+                    entry = previous_by_url[page.url]
+                elif not page.result.ok:
+                    # Keep what the last run had for pages that fail transiently
+                    entry = previous_by_url.get(page.url)
+                elif page.is_html and executor is not None:
+                    entry = await loop.run_in_executor(executor, parse_page, page.url, page.result.content)
+                elif page.is_html:
+                    entry = parse_page(page.url, page.result.content)
+                else:
+                    entry = None
+                if entry and entry.get("content"):
+                    out.write({**entry, "links": page.links})
+        logger.info(f"Fetch stats: {fetcher.stats}")
+    return out.count
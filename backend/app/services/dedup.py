@@ -0,0 +1,219 @@
+"""
+Boilerplate and near-duplicate removal for ingested knowledge
+Word shingles find text repeated across pages (menus, footers, banners) or
+within a page; MinHash with LSH banding drops near-identical passages.
+Both keep state so pages can be added or replaced one at a time.
+"""
+import hashlib
+import math
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Set, Tuple
+import numpy as np
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+FNV_PRIME = 0x01000193
+
+
+def _runs(marks: bytearray) -> Iterable[Tuple[int, int]]:
+    """(start, end) of each run of set marks"""
+    start = None
+    for i, mark in enumerate(marks):
+        if mark and start is None:
+            start = i
+        elif not mark and start is not None:
+            yield start, i
+            start = None
+    if start is not None:
+        yield start, len(marks)
+
+
+class BoilerplateRemover:
+    """
+    Remove text blocks shared by many pages and repeats within a page.
+
+    A block is boilerplate when its shingles appear on at least
+    `min_fraction` of pages (and `min_pages` pages) and it spans at least
+    `min_block_words` words, so short phrases pages happen to share stay.
+    """
+
+    def __init__(self, shingle_size: int = 8, min_pages: int = 2, min_fraction: float = 0.5, min_block_words: int = 12):
+        self.shingle_size = shingle_size
+        self.min_pages = min_pages
+        self.min_fraction = min_fraction
+        self.min_block_words = min_block_words
+        self._pages: Dict[str, Tuple[str, Set[int]]] = {}
+        self._df: Counter = Counter()
+
+    def _shingles(self, words: List[str]) -> List[int]:
+        k = self.shingle_size
+        lowered = [w.lower() for w in words]
+        return [hash(tuple(lowered[i:i + k])) for i in range(len(words) - k + 1)]
+
+    def add(self, key: str, text: str):
+        """Count a page's shingles; re-adding a key replaces its previous text"""
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        current = self._pages.get(key)
+        if current is not None:
+            if current[0] == digest:
+                return
+            self.remove(key)
+        shingles = set(self._shingles(text.split()))
+        self._df.update(shingles)
+        self._pages[key] = (digest, shingles)
+
+    def remove(self, key: str):
+        current = self._pages.pop(key, None)
+        if current is not None:
+            self._df.subtract(current[1])
+            for shingle in current[1]:
+                if self._df[shingle] <= 0:
+                    del self._df[shingle]
+
+    def sync(self, pages: Dict[str, str]):
+        """Make the counted pages match `pages` (key -> text), touching only changes"""
+        for key in set(self._pages) - set(pages):
+            self.remove(key)
+        for key, text in pages.items():
+            self.add(key, text)
+
+    def threshold(self) -> int:
+        return max(self.min_pages, math.ceil(self.min_fraction * len(self._pages)))
+
+    def clean(self, text: str) -> str:
+        words = text.split()
+        k = self.shingle_size
+        if len(words) < k:
+            return text
+
+        threshold = self.threshold()
+        drop = bytearray(len(words))
+        shared = bytearray(len(words))
+        first_seen: Dict[int, int] = {}
+        for i, shingle in enumerate(self._shingles(words)):
+            if shingle in first_seen:
+                # Repeat within this page: keep only the first occurrence
+                drop[i:i + k] = b"\x01" * k
+            else:
+                first_seen[shingle] = i
+            if self._df.get(shingle, 0) >= threshold:
+                shared[i:i + k] = b"\x01" * k
+
+        for start, end in _runs(shared):
+            if end - start >= self.min_block_words:
+                drop[start:end] = b"\x01" * (end - start)
+
+        return " ".join(word for word, dropped in zip(words, drop) if not dropped)
+
+
+class MinHasher:
+    """
+    MinHash signatures over token shingles, computed with NumPy.
+
+    Tokens are hashed once with crc32 and combined into 32-bit shingle
+    hashes; all permutations are then applied in one (num_perm x shingles)
+    array operation. Parameters stay below 2**32 so a * v + b fits in uint64.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MAX_HASH, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, MAX_HASH, size=(num_perm, 1), dtype=np.uint64)
+
+    def shingle_hashes(self, tokens: List[str]) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(token.encode("utf-8")) for token in tokens), dtype=np.uint64, count=len(tokens)
+        )
+        # Shorter texts are a single shingle of all their tokens
+        k = min(self.shingle_size, len(hashes))
+        if k == 0:
+            return np.zeros(1, dtype=np.uint64)
+        n = len(hashes) - k + 1
+        grams = hashes[:n].copy()
+        for j in range(1, k):
+            grams = (grams * np.uint64(FNV_PRIME) + hashes[j:j + n]) & np.uint64(MAX_HASH)
+        return np.unique(grams)
+
+    def signature(self, tokens: List[str]) -> Tuple[int, ...]:
+        values = self.shingle_hashes(tokens)[None, :]
+        permuted = (self._a * values + self._b) % np.uint64(MERSENNE_PRIME) & np.uint64(MAX_HASH)
+        return tuple(permuted.min(axis=1).tolist())
+
+
+def jaccard(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / len(sig_a)
+
+
+class NearDuplicateFilter:
+    """Accept signatures unless an accepted one is at least `threshold` similar"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.8):
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        self._accepted: List[Tuple[int, ...]] = []
+
+    def add(self, signature: Tuple[int, ...]) -> bool:
+        """True if kept, False if it nearly duplicates something already kept"""
+        keys = [
+            (band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+        candidates = {i for key in keys for i in self._buckets.get(key, ())}
+        for i in candidates:
+            if jaccard(signature, self._accepted[i]) >= self.threshold:
+                return False
+        index = len(self._accepted)
+        self._accepted.append(signature)
+        for key in keys:
+            self._buckets.setdefault(key, []).append(index)
+        return True
+
+
+def _page_keys(entries: List[Dict]) -> List[str]:
+    """Stable remover key per entry: its url, numbered when a url repeats"""
+    keys = []
+    seen: Counter = Counter()
+    for i, entry in enumerate(entries):
+        key = entry.get("url") or f"#{i}"
+        seen[key] += 1
+        keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+    return keys
+
+
+def clean_entries(remover: BoilerplateRemover, entries: List[Dict]) -> Tuple[List[Dict], Dict[str, int]]:
+    """
+    Strip boilerplate from knowledge entries, updating the remover incrementally.
+
+    Only scraped pages (entries with `content`) are cleaned; structured
+    entries pass through untouched. Pages left empty are dropped.
+    Returns (entries, report).
+    """
+    keys = _page_keys(entries)
+    pages = {key: entry["content"] for key, entry in zip(keys, entries) if entry.get("content")}
+    remover.sync(pages)
+
+    cleaned = []
+    bytes_in = bytes_out = 0
+    for key, entry in zip(keys, entries):
+        if key not in pages:
+            cleaned.append(entry)
+            continue
+        content = pages[key]
+        text = remover.clean(content)
+        bytes_in += len(content.encode("utf-8"))
+        bytes_out += len(text.encode("utf-8"))
+        if text:
+            cleaned.append({**entry, "content": text})
+
+    return cleaned, {
+        "pages": len(pages),
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "bytes_saved": bytes_in - bytes_out,
+    }
@@ -0,0 +1,98 @@
+"""
+Streaming exports of leads and conversation transcripts
+Rows are read from Motor cursors in batches and encoded one at a time, so
+memory stays flat regardless of how many records a tenant has.
+"""
+from bson import ObjectId
+from datetime import datetime
+from typing import AsyncIterator, Dict, Sequence
+from ..config import settings
+from ..database import get_collection
+import csv
+import io
+import json
+import zlib
+
+LEAD_COLUMNS = ("_id", "session_id", "name", "email", "phone", "message", "created_at")
+MESSAGE_COLUMNS = ("session_id", "seq", "role", "content", "timestamp")
+
+# Encoded rows are buffered up to this size before being handed to the server
+FLUSH_BYTES = 64 * 1024
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+async def iter_leads(query: Dict) -> AsyncIterator[Dict]:
+    leads_collection = get_collection("leads")
+    projection = {column: 1 for column in LEAD_COLUMNS}
+    cursor = leads_collection.find(query, projection).sort([("created_at", -1), ("_id", -1)])
+    async for lead in cursor.batch_size(settings.export_batch_size):
+        yield lead
+
+
+async def iter_messages(client_id: str) -> AsyncIterator[Dict]:
+    """Every message of a tenant, one row per message"""
+    conversations_collection = get_collection("conversations")
+    pages_collection = get_collection("conversation_messages")
+
+    # Sessions written before bucketing keep their first messages inline
+    legacy = conversations_collection.find(
+        {"client_id": client_id, "messages.0": {"$exists": True}},
+        {"session_id": 1, "messages": 1}
+    ).batch_size(settings.export_batch_size)
+    async for conversation in legacy:
+        for seq, message in enumerate(conversation.get("messages", [])):
+            yield {"session_id": conversation["session_id"], "seq": seq, **message}
+
+    pages = pages_collection.find(
+        {"client_id": client_id},
+        {"_id": 0, "session_id": 1, "messages": 1}
+    ).sort([("session_id", 1), ("page", 1)]).batch_size(settings.export_batch_size)
+    async for page in pages:
+        for message in sorted(page["messages"], key=lambda m: m["seq"]):
+            yield {"session_id": page["session_id"], **message}
+
+
+async def encode_ndjson(rows: AsyncIterator[Dict], columns: Sequence[str]) -> AsyncIterator[bytes]:
+    buffer = []
+    size = 0
+    async for row in rows:
+        line = json.dumps({column: _plain(row.get(column)) for column in columns}, ensure_ascii=False) + "\n"
+        encoded = line.encode("utf-8")
+        buffer.append(encoded)
+        size += len(encoded)
+        if size >= FLUSH_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+async def encode_csv(rows: AsyncIterator[Dict], columns: Sequence[str]) -> AsyncIterator[bytes]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    async for row in rows:
+        writer.writerow([_plain(row.get(column)) for column in columns])
+        if out.tell() >= FLUSH_BYTES:
+            yield out.getvalue().encode("utf-8")
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode("utf-8")
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Incrementally gzip a byte stream"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
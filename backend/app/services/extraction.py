@@ -0,0 +1,132 @@
+"""
+HTML to text extraction shared by the scrapers
+lxml parses and strips unwanted elements in a single tree pass; BeautifulSoup
+is only used when lxml cannot make sense of the input.
+"""
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import lxml.html
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STRIP = ("script", "style", "noscript", "template", "nav", "footer", "header")
+
+# Candidates for the main content area, most specific first
+MAIN_XPATHS = (
+    "//main",
+    "//article",
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' content ')"
+    " or contains(concat(' ', normalize-space(@class), ' '), ' main-content ')"
+    " or contains(concat(' ', normalize-space(@class), ' '), ' page-content ')]",
+    "//body",
+)
+
+
+def clean_text(text: str) -> str:
+    """Collapse all whitespace runs to single spaces"""
+    return " ".join(text.split())
+
+
+def _extract_lxml(content: bytes, strip: Sequence[str], main_only: bool) -> Dict[str, str]:
+    doc = lxml.html.document_fromstring(content)
+    title = clean_text(doc.findtext(".//title") or "")
+    description = clean_text(doc.xpath("string(//meta[@name='description']/@content)"))
+
+    # One walk of the tree removes every unwanted element and comment
+    etree.strip_elements(doc, etree.Comment, *strip, with_tail=False)
+
+    root = doc
+    if main_only:
+        for xpath in MAIN_XPATHS:
+            found = doc.xpath(xpath)
+            if found:
+                root = found[0]
+                break
+
+    text = " ".join(chunk.strip() for chunk in root.itertext() if chunk.strip())
+    return {"title": title, "description": description, "text": clean_text(text)}
+
+
+def _extract_soup(content: bytes, strip: Sequence[str], main_only: bool) -> Dict[str, str]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, "html.parser")
+    title_tag = soup.find("title")
+    title = clean_text(title_tag.get_text()) if title_tag else ""
+    meta = soup.find("meta", {"name": "description"})
+    description = clean_text(meta.get("content", "")) if meta else ""
+
+    for element in soup(list(strip)):
+        element.decompose()
+
+    root = soup
+    if main_only:
+        root = (
+            soup.find("main")
+            or soup.find("article")
+            or soup.find("div", class_=["content", "main-content", "page-content"])
+            or soup.find("body")
+            or soup
+        )
+    return {"title": title, "description": description, "text": clean_text(root.get_text(separator=" ", strip=True))}
+
+
+def extract(content: bytes, strip: Sequence[str] = DEFAULT_STRIP, main_only: bool = False) -> Dict[str, str]:
+    """
+    Title, meta description and visible text of an HTML document.
+
+    With `main_only`, text comes from the first <main>, <article> or content
+    <div>, falling back to <body>.
+    """
+    try:
+        return _extract_lxml(content, strip, main_only)
+    except (etree.ParserError, etree.XMLSyntaxError, ValueError) as e:
+        logger.debug(f"lxml could not parse document, using BeautifulSoup: {e}")
+        return _extract_soup(content, strip, main_only)
+
+
+def _extract_job(job: Tuple[str, bytes, Sequence[str], bool]) -> Tuple[str, Dict[str, str]]:
+    url, content, strip, main_only = job
+    return url, extract(content, strip, main_only)
+
+
+def _extract_chunk(jobs: List[Tuple[str, bytes, Sequence[str], bool]]) -> List[Tuple[str, Dict[str, str]]]:
+    return [_extract_job(job) for job in jobs]
+
+
+def extract_many(
+    pages: Iterable[Tuple[str, bytes]],
+    strip: Sequence[str] = DEFAULT_STRIP,
+    main_only: bool = False,
+    workers: Optional[int] = None,
+    chunksize: int = 16,
+    max_pending: Optional[int] = None,
+) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """
+    Extract (url, html) pairs, in order, across a process pool.
+
+    workers=1 runs inline; None uses one process per CPU. Pages are sent in
+    chunks of `chunksize` with at most `max_pending` chunks in flight
+    (default two per worker), so a large or lazy `pages` iterable is read
+    only as fast as results are consumed; Executor.map would queue it all.
+    """
+    jobs = ((url, content, tuple(strip), main_only) for url, content in pages)
+    if workers == 1:
+        yield from map(_extract_job, jobs)
+        return
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    chunks = iter(lambda: list(islice(jobs, chunksize)), [])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_extract_chunk, chunk))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
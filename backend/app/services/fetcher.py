@@ -0,0 +1,213 @@
+"""
+Async page fetcher shared by the scrapers
+Bounded concurrency and a token-bucket rate per host, plus conditional GETs
+from ETag / Last-Modified validators persisted between runs.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+import httpx
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (compatible; ProdeskBot/1.0)"
+
+
+class TokenBucket:
+    """Allow `rate` requests per second on average, with bursts up to `burst`"""
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ValidatorStore:
+    """Per-URL ETag, Last-Modified and body hash, saved as JSON"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.entries: Dict[str, Dict[str, str]] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable fetch state {path}: {e}")
+
+    def get(self, url: str) -> Dict[str, str]:
+        return self.entries.get(url, {})
+
+    def update(self, url: str, response: httpx.Response, content_hash: str):
+        entry = {"content_hash": content_hash}
+        if response.headers.get("etag"):
+            entry["etag"] = response.headers["etag"]
+        if response.headers.get("last-modified"):
+            entry["last_modified"] = response.headers["last-modified"]
+        self.entries[url] = entry
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int = 0
+    content: Optional[bytes] = None
+    # True when the server answered 304 or returned a byte-identical body
+    unchanged: bool = False
+    final_url: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class Fetcher:
+    """
+    Fetch many URLs concurrently while staying polite to each host.
+
+    Use as an async context manager; validators are saved on exit.
+    """
+
+    def __init__(
+        self,
+        per_host_concurrency: int = 4,
+        rate: float = 2.0,
+        burst: float = 2,
+        timeout: float = 15.0,
+        state_path: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        user_agent: str = USER_AGENT,
+    ):
+        self.per_host_concurrency = per_host_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.validators = ValidatorStore(state_path)
+        self._client = client
+        self._owns_client = client is None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.stats = {"fetched": 0, "not_modified": 0, "unchanged": 0, "errors": 0}
+
+    async def __aenter__(self) -> "Fetcher":
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": self.user_agent},
+            )
+        return self
+
+    async def __aexit__(self, *exc):
+        self.validators.save()
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _host_limits(self, url: str):
+        host = urlsplit(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host_concurrency)
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return self._semaphores[host], self._buckets[host]
+
+    async def fetch(self, url: str, conditional: bool = True) -> FetchResult:
+        """
+        GET a URL. With `conditional`, stored validators are sent and an
+        unchanged page comes back with `unchanged=True` and no content.
+        """
+        semaphore, bucket = self._host_limits(url)
+        headers = {}
+        known = self.validators.get(url) if conditional else {}
+        if known.get("etag"):
+            headers["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            headers["If-Modified-Since"] = known["last_modified"]
+
+        async with semaphore:
+            await bucket.acquire()
+            try:
+                response = await self._client.get(url, headers=headers)
+            except httpx.HTTPError as e:
+                self.stats["errors"] += 1
+                logger.error(f"Error fetching {url}: {e}")
+                return FetchResult(url=url, error=str(e))
+
+        result = FetchResult(
+            url=url,
+            status=response.status_code,
+            final_url=str(response.url),
+            headers=dict(response.headers),
+        )
+        if response.status_code == 304:
+            self.stats["not_modified"] += 1
+            result.unchanged = True
+            return result
+        if response.is_error:
+            self.stats["errors"] += 1
+            result.error = f"HTTP {response.status_code}"
+            logger.error(f"Error fetching {url}: {result.error}")
+            return result
+
+        self.stats["fetched"] += 1
+        content_hash = hashlib.sha1(response.content).hexdigest()
+        if conditional and known.get("content_hash") == content_hash:
+            # Server without validators, but the body is byte-identical
+            self.stats["unchanged"] += 1
+            result.unchanged = True
+        else:
+            result.content = response.content
+        self.validators.update(url, response, content_hash)
+        return result
+
+    async def fetch_all(self, urls: Iterable[str], conditional: Optional[Iterable[str]] = None) -> AsyncIterator[FetchResult]:
+        """
+        Fetch URLs concurrently, yielding results as they complete.
+
+        `conditional` limits conditional GETs to those URLs (e.g. the ones whose
+        previous output is still available); by default every URL is conditional.
+        """
+        conditional = set(conditional) if conditional is not None else None
+        tasks = [
+            asyncio.create_task(self.fetch(url, conditional is None or url in conditional))
+            for url in dict.fromkeys(urls)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,81 @@
+"""
+Rank fusion and reranking for hybrid retrieval
+Reciprocal rank fusion merges keyword and vector candidate lists without
+calibrating their scores; a term-proximity pass then orders the fused
+candidates by how completely and tightly they contain the query terms.
+"""
+import math
+from operator import itemgetter
+from typing import Callable, Dict, Hashable, Iterable, List, Sequence, Set, Tuple
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """(doc id, sum of 1 / (k + rank)) over every ranking, best first"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=itemgetter(1), reverse=True)
+
+
+def min_window(positions: Dict[Hashable, List[int]]) -> int:
+    """Shortest token span holding at least one occurrence of every term"""
+    events = sorted((pos, term) for term, plist in positions.items() for pos in plist)
+    counts: Dict[Hashable, int] = {}
+    have = 0
+    left = 0
+    best = math.inf
+    for pos, term in events:
+        counts[term] = counts.get(term, 0) + 1
+        if counts[term] == 1:
+            have += 1
+        while have == len(positions):
+            left_pos, left_term = events[left]
+            best = min(best, pos - left_pos + 1)
+            counts[left_term] -= 1
+            if counts[left_term] == 0:
+                have -= 1
+            left += 1
+    return int(best)
+
+
+def proximity_score(query_terms: Set[Hashable], tokens: Sequence[Hashable]) -> float:
+    """
+    Query term coverage, boosted when the matched terms sit close together.
+
+    0 when no term matches, 1 when every term appears in one contiguous run.
+    """
+    if not query_terms:
+        return 0.0
+    positions: Dict[Hashable, List[int]] = {}
+    for i, token in enumerate(tokens):
+        if token in query_terms:
+            positions.setdefault(token, []).append(i)
+    if not positions:
+        return 0.0
+    coverage = len(positions) / len(query_terms)
+    compactness = len(positions) / min_window(positions)
+    return coverage * (0.5 + 0.5 * compactness)
+
+
+def rerank(
+    query_terms: Set[Hashable],
+    fused: Sequence[Tuple[int, float]],
+    passage_tokens: Callable[[int], Sequence[Hashable]],
+    weight: float = 0.5
+) -> List[Tuple[int, float]]:
+    """
+    Blend normalized fusion scores with proximity; returns (doc id, score), best first.
+
+    Query terms and passage tokens only need to be comparable: strings for
+    an in-memory index, term ids for a snapshot.
+    """
+    if not fused:
+        return []
+    best = fused[0][1]
+    scored = [
+        (doc_id, (1 - weight) * score / best + weight * proximity_score(query_terms, passage_tokens(doc_id)))
+        for doc_id, score in fused
+    ]
+    scored.sort(key=itemgetter(1), reverse=True)
+    return scored
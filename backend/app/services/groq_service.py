@@ -1,37 +1,100 @@
-from groq import Groq
+from groq import NOT_GIVEN, AsyncGroq
+from typing import AsyncIterator, Dict, List, Optional
 from ..config import settings
+from .http_client import get_http_client
+import asyncio
+import httpx
 import logging
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You are a helpful customer support assistant for Prodesk, a software development company. Provide accurate, friendly, and professional responses based on the provided context."
+
 class GroqService:
-    """Service for Groq API interactions"""
-    
+    """Async gateway for all Groq chat completions"""
+
     def __init__(self):
-        self.client = Groq(api_key=settings.groq_api_key)
-        self.model = "llama-3.1-8b-instant"
-    
-    def generate_response(self, prompt: str, temperature: float = 0.5) -> str:
+        self.model = settings.groq_model
+        self.timeout = settings.groq_timeout
+        # Bounds in-flight LLM calls per worker; excess callers wait their turn
+        self._semaphore = asyncio.Semaphore(settings.groq_max_concurrency)
+        self._client: Optional[AsyncGroq] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+
+    def _timeout(self, read: Optional[float] = None) -> httpx.Timeout:
+        """The pool's connect/write/pool limits with the completion read timeout"""
+        return httpx.Timeout(
+            connect=settings.http_connect_timeout,
+            read=read or self.timeout,
+            write=settings.http_write_timeout,
+            pool=settings.http_pool_timeout,
+        )
+
+    @property
+    def client(self) -> AsyncGroq:
+        """AsyncGroq bound to the shared connection pool, rebuilt if the pool changes"""
+        http_client = get_http_client()
+        if self._client is None or self._http_client is not http_client:
+            self._client = AsyncGroq(
+                api_key=settings.groq_api_key,
+                base_url=settings.groq_base_url,
+                max_retries=settings.groq_max_retries,
+                timeout=self._timeout(),
+                http_client=http_client,
+            )
+            self._http_client = http_client
+        return self._client
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.5,
+        max_tokens: int = 500,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """Return the full completion text; raises on API errors"""
+        async with self._semaphore:
+            completion = await self.client.chat.completions.create(
+                messages=messages,
+                model=self.model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=self._timeout(timeout) if timeout else NOT_GIVEN,
+            )
+        return completion.choices[0].message.content
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.5,
+        max_tokens: int = 500,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """Yield completion tokens as they arrive; raises on API errors"""
+        async with self._semaphore:
+            stream = await self.client.chat.completions.create(
+                messages=messages,
+                model=self.model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=self._timeout(timeout) if timeout else NOT_GIVEN,
+                stream=True,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    async def generate_response(self, prompt: str, temperature: float = 0.5) -> str:
         """Generate response using Groq"""
         try:
-            completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful customer support assistant for Prodesk, a software development company. Provide accurate, friendly, and professional responses based on the provided context."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
+            return await self.complete(
+                [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
                 ],
-                model=self.model,
                 temperature=temperature,
-                max_tokens=500,
             )
-            
-            return completion.choices[0].message.content
-        
+
         except Exception as e:
             logger.error(f"Groq API error: {e}")
             return "I apologize, but I'm having trouble processing your request right now. Please try again."
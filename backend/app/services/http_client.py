@@ -0,0 +1,61 @@
+"""
+Application-lifetime pooled HTTP client for outbound API calls
+Opened and closed by the FastAPI lifespan in app.main
+"""
+import importlib.util
+import logging
+from typing import Optional
+import httpx
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+class HTTPClient:
+    client: Optional[httpx.AsyncClient] = None
+
+http = HTTPClient()
+
+
+def _use_http2() -> bool:
+    """HTTP/2 needs the optional h2 package (httpx[http2])"""
+    return settings.http2_enabled and importlib.util.find_spec("h2") is not None
+
+
+def _build_client() -> httpx.AsyncClient:
+    """Create an AsyncClient from settings"""
+    return httpx.AsyncClient(
+        http2=_use_http2(),
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            connect=settings.http_connect_timeout,
+            read=settings.http_read_timeout,
+            write=settings.http_write_timeout,
+            pool=settings.http_pool_timeout,
+        ),
+    )
+
+
+async def open_http_client():
+    """Create the shared connection pool"""
+    if http.client is None:
+        http.client = _build_client()
+        logger.info(f"Opened shared HTTP client (http2={_use_http2()})")
+
+
+async def close_http_client():
+    """Close the shared connection pool"""
+    if http.client is not None:
+        await http.client.aclose()
+        http.client = None
+        logger.info("Closed shared HTTP client")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared client, creating it if used outside the app lifespan"""
+    if http.client is None:
+        http.client = _build_client()
+    return http.client
@@ -0,0 +1,119 @@
+"""
+Searchable knowledge built from a list of entries
+Passages, tokens and MinHash signatures are kept per entry content hash, so
+a rebuild after an edit only processes the entries that changed.
+"""
+import hashlib
+from typing import Dict, List, Optional, Set, Tuple
+from ..config import settings
+from .chunker import chunk_documents
+from .dedup import BoilerplateRemover, MinHasher, NearDuplicateFilter, clean_entries
+from .search_index import SearchIndex, tokenize
+
+# Rough per-token overhead of postings and token lists, in bytes
+TOKEN_BYTES = 48
+
+minhasher = MinHasher()
+
+
+def entry_text(entry: Dict) -> str:
+    """Text of a knowledge entry; entries without `content` use all their values"""
+    if entry.get("content"):
+        return entry["content"]
+    return "\n".join(str(v) for k, v in entry.items() if k not in ("url", "source") and v)
+
+
+def knowledge_hash(entries: List[Dict]) -> str:
+    """Content hash of a list of entries, used to tell an index is stale"""
+    digest = hashlib.sha1()
+    for entry in entries or []:
+        digest.update(entry_text(entry).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _entry_key(entry: Dict) -> str:
+    raw = f"{entry.get('url', '')}\0{entry.get('source', '')}\0{entry_text(entry)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class KnowledgeIndex:
+    """BM25 index over a set of entries, keeping per-entry work for reuse"""
+
+    def __init__(self, version: str, entries: Dict[str, Tuple[List[Dict], List[List[str]], List[Tuple[int, ...]]]], reused: int = 0):
+        self.version = version
+        # entry hash -> (passages, token lists, signatures), reused by incremental rebuilds
+        self.entries = entries
+        self.reused = reused
+        self.passages: List[Dict] = []
+        self.duplicates = 0
+        self.tokens: List[List[str]] = []
+        near_duplicates = NearDuplicateFilter(num_perm=minhasher.num_perm)
+        for passages, tokens, signatures in entries.values():
+            for passage, passage_tokens, signature in zip(passages, tokens, signatures):
+                if not near_duplicates.add(signature):
+                    self.duplicates += 1
+                    continue
+                self.passages.append(passage)
+                self.tokens.append(passage_tokens)
+        self.index = SearchIndex.from_tokens(self.tokens)
+        self.size_bytes = sum(len(p["content"]) for p in self.passages) + TOKEN_BYTES * sum(len(t) for t in self.tokens)
+
+    @classmethod
+    def build(
+        cls,
+        version: str,
+        knowledge: List[Dict],
+        previous: Optional["KnowledgeIndex"] = None,
+        default_source: str = ""
+    ) -> "KnowledgeIndex":
+        """Chunk and tokenize only the entries that are not in `previous`"""
+        previous_entries = previous.entries if previous is not None else {}
+        entries = {}
+        reused = 0
+        for entry in knowledge:
+            key = _entry_key(entry)
+            if key in entries:
+                continue
+            if key in previous_entries:
+                entries[key] = previous_entries[key]
+                reused += 1
+                continue
+            passages = chunk_documents(
+                [{
+                    "url": entry.get("url", ""),
+                    "source": entry.get("source") or default_source,
+                    "content": entry_text(entry)
+                }],
+                max_words=settings.chunk_max_words,
+                overlap_words=settings.chunk_overlap_words
+            )
+            tokens = [tokenize(p["content"]) for p in passages]
+            entries[key] = (passages, tokens, [minhasher.signature(t) for t in tokens])
+        return cls(version, entries, reused)
+
+    def query_terms(self, query: str) -> Set[str]:
+        return set(tokenize(query))
+
+    def passage_tokens(self, doc_id: int) -> List[str]:
+        return self.tokens[doc_id]
+
+    def search_ids(self, query: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """Up to top_k (passage position, score) pairs, best first"""
+        return self.index.search(query, top_k)
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[Dict, float]]:
+        """Up to top_k (passage, score) pairs, best first"""
+        return [(self.passages[doc_id], score) for doc_id, score in self.search_ids(query, top_k)]
+
+
+def build_corpus(
+    entries: List[Dict],
+    remover: BoilerplateRemover,
+    previous: Optional[KnowledgeIndex] = None
+) -> Tuple[KnowledgeIndex, Dict]:
+    """Strip boilerplate from scraped pages, then index them; returns (index, ingest report)"""
+    cleaned, report = clean_entries(remover, entries)
+    knowledge = KnowledgeIndex.build(knowledge_hash(entries), cleaned, previous)
+    report["duplicate_passages"] = knowledge.duplicates
+    return knowledge, report
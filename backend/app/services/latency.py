@@ -0,0 +1,112 @@
+"""
+Per-stage request timing and mergeable log-bucketed latency histograms
+"""
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# 8 sub-buckets per power of two: ~9% worst-case relative error, like a
+# low-precision HDR histogram. Values are recorded in microseconds.
+SUB_BUCKETS = 8
+
+
+def bucket_index(ms: float) -> int:
+    return int(math.log2(max(ms * 1000.0, 1.0)) * SUB_BUCKETS)
+
+
+def bucket_upper_ms(index: int) -> float:
+    return 2 ** ((index + 1) / SUB_BUCKETS) / 1000.0
+
+
+class StageTimer:
+    """Accumulates wall time per named stage of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def mark(self, name: str):
+        """Record elapsed time since the timer started, e.g. time to first token"""
+        if name not in self.stages:
+            self.stages[name] = (time.perf_counter() - self.started) * 1000
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+class LatencyHistogram:
+    """Bucket counts plus exact sum; merge by adding buckets"""
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def record(self, ms: float):
+        index = bucket_index(ms)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum_ms += ms
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.count += other.count
+        self.sum_ms += other.sum_ms
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper edge of the bucket holding the p-th percentile (p in 0..100)"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100.0))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return bucket_upper_ms(index)
+        return bucket_upper_ms(max(self.buckets))
+
+    def mean(self) -> Optional[float]:
+        return (self.sum_ms / self.count) if self.count else None
+
+    def summary(self) -> Dict:
+        def rounded(value):
+            return round(value, 2) if value is not None else None
+        return {
+            "count": self.count,
+            "mean_ms": rounded(self.mean()),
+            "p50_ms": rounded(self.percentile(50)),
+            "p95_ms": rounded(self.percentile(95)),
+            "p99_ms": rounded(self.percentile(99)),
+        }
+
+    @staticmethod
+    def increments(prefix: str, ms: float) -> Dict[str, float]:
+        """$inc fields recording one sample under a document prefix"""
+        return {
+            f"{prefix}.b{bucket_index(ms)}": 1,
+            f"{prefix}.count": 1,
+            f"{prefix}.sum": ms,
+        }
+
+    @classmethod
+    def from_doc(cls, doc: Dict) -> "LatencyHistogram":
+        histogram = cls()
+        histogram.count = doc.get("count", 0)
+        histogram.sum_ms = doc.get("sum", 0.0)
+        for key, n in doc.items():
+            if key.startswith("b"):
+                histogram.buckets[int(key[1:])] = n
+        return histogram
@@ -0,0 +1,203 @@
+"""
+Approximate top-k user queries per tenant
+Space-Saving counters refined by a Count-Min sketch, merged across workers in Mongo
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from pymongo.errors import DuplicateKeyError
+from ..config import settings
+from ..database import get_collection
+from .response_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+class HeavyHitters:
+    """
+    Space-Saving summary of the k most frequent items plus a Count-Min
+    sketch. Both are mergeable, so per-worker deltas can be folded into one
+    persisted summary. Counts are overestimates bounded by the sketch error.
+    """
+
+    def __init__(self, k: int = 64, width: int = 512, depth: int = 4):
+        self.k = k
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        # item -> [count, overestimation error]
+        self.counters: Dict[str, List[int]] = {}
+        self.table = [[0] * width for _ in range(depth)]
+
+    def _cells(self, item: str) -> List[int]:
+        # Stable across processes, unlike hash()
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[i * 8:(i + 1) * 8], "little") % self.width for i in range(self.depth)]
+
+    def estimate(self, item: str) -> int:
+        """Count-Min upper bound for an item"""
+        return min(self.table[row][col] for row, col in enumerate(self._cells(item)))
+
+    def add(self, item: str, count: int = 1):
+        self.total += count
+        for row, col in enumerate(self._cells(item)):
+            self.table[row][col] += count
+
+        entry = self.counters.get(item)
+        if entry is not None:
+            entry[0] += count
+        elif len(self.counters) < self.k:
+            self.counters[item] = [count, 0]
+        else:
+            # Replace the smallest counter; the newcomer inherits its count as error
+            victim = min(self.counters, key=lambda i: self.counters[i][0])
+            floor = self.counters.pop(victim)[0]
+            self.counters[item] = [floor + count, floor]
+
+    def merge(self, other: "HeavyHitters"):
+        """Fold another summary (same dimensions) into this one"""
+        self.total += other.total
+        for row in range(self.depth):
+            mine, theirs = self.table[row], other.table[row]
+            for col in range(self.width):
+                mine[col] += theirs[col]
+
+        candidates = set(self.counters) | set(other.counters)
+        merged = {}
+        for item in candidates:
+            a = self.counters.get(item, [0, 0])
+            b = other.counters.get(item, [0, 0])
+            guaranteed = (a[0] - a[1]) + (b[0] - b[1])
+            count = self.estimate(item)
+            merged[item] = [count, max(count - guaranteed, 0)]
+
+        top = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)[:self.k]
+        self.counters = dict(top)
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        """n most frequent items with their estimated counts"""
+        ranked = [(item, min(count, self.estimate(item))) for item, (count, _) in self.counters.items()]
+        ranked.sort(key=lambda kv: kv[1], reverse=True)
+        return ranked[:n]
+
+    def to_doc(self) -> Dict:
+        return {
+            "k": self.k,
+            "width": self.width,
+            "depth": self.depth,
+            "total": self.total,
+            "counters": [[item, count, error] for item, (count, error) in self.counters.items()],
+            "table": self.table,
+        }
+
+    @classmethod
+    def from_doc(cls, doc: Dict) -> "HeavyHitters":
+        sketch = cls(k=doc["k"], width=doc["width"], depth=doc["depth"])
+        sketch.total = doc["total"]
+        sketch.counters = {item: [count, error] for item, count, error in doc["counters"]}
+        sketch.table = doc["table"]
+        return sketch
+
+
+class QuerySketchStore:
+    """Per-tenant deltas in memory, flushed periodically into query_sketches"""
+
+    def __init__(self, k: int = 64, width: int = 512, depth: int = 4, flush_interval: float = 30):
+        self.k = k
+        self.width = width
+        self.depth = depth
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, HeavyHitters] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _new(self) -> HeavyHitters:
+        return HeavyHitters(k=self.k, width=self.width, depth=self.depth)
+
+    def record(self, client_id: str, query: str):
+        """Count a user query for the tenant"""
+        normalized = normalize_query(query)
+        if not normalized:
+            return
+        sketch = self._pending.get(client_id)
+        if sketch is None:
+            sketch = self._pending[client_id] = self._new()
+        sketch.add(normalized)
+
+    async def _merge_into_db(self, client_id: str, delta: HeavyHitters) -> bool:
+        """Optimistic read-merge-write of the tenant's persisted summary"""
+        collection = get_collection("query_sketches")
+        if collection is None:
+            return False
+
+        for _ in range(5):
+            doc = await collection.find_one({"_id": client_id})
+            merged = HeavyHitters.from_doc(doc["sketch"]) if doc else self._new()
+            merged.merge(delta)
+            new_doc = {"version": (doc["version"] + 1) if doc else 1, "sketch": merged.to_doc(), "updated_at": datetime.utcnow()}
+
+            if doc is None:
+                try:
+                    await collection.insert_one({"_id": client_id, **new_doc})
+                    return True
+                except DuplicateKeyError:
+                    continue
+
+            result = await collection.replace_one({"_id": client_id, "version": doc["version"]}, new_doc)
+            if result.matched_count:
+                return True
+        return False
+
+    async def flush(self):
+        """Persist and reset every tenant's pending delta"""
+        pending, self._pending = self._pending, {}
+        for client_id, delta in pending.items():
+            try:
+                merged = await self._merge_into_db(client_id, delta)
+            except Exception as e:
+                logger.warning(f"Query sketch flush failed for {client_id}: {e}")
+                merged = False
+            if not merged:
+                # Keep the counts for the next attempt
+                self._pending.setdefault(client_id, self._new()).merge(delta)
+
+    async def top(self, client_id: str, n: int = 5) -> List[str]:
+        """Top-n queries across all workers' flushed counts plus local pending ones"""
+        combined = self._new()
+        collection = get_collection("query_sketches")
+        if collection is not None:
+            doc = await collection.find_one({"_id": client_id})
+            if doc:
+                combined.merge(HeavyHitters.from_doc(doc["sketch"]))
+        pending = self._pending.get(client_id)
+        if pending is not None:
+            combined.merge(pending)
+        return [item for item, _ in combined.top(n)]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and persist what is left"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+query_sketches = QuerySketchStore(
+    k=settings.query_sketch_k,
+    width=settings.query_sketch_width,
+    depth=settings.query_sketch_depth,
+    flush_interval=settings.query_sketch_flush_interval,
+)
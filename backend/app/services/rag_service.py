@@ -2,89 +2,374 @@
 Lightweight RAG without heavy ML libraries
 Uses Groq API for everything
 """
+import asyncio
 import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import httpx
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from ..config import settings
+from .chunker import build_context
+from .groq_service import groq_service
+from .latency import StageTimer
+from .response_cache import response_cache
+from .dedup import BoilerplateRemover
+from .fusion import reciprocal_rank_fusion, rerank
+from .knowledge_index import KnowledgeIndex, build_corpus, knowledge_hash
+from .snapshot import SnapshotError, SnapshotIndex, source_stat
+from .vector_index import VectorIndex, build_vectors, load_vectors
 
 logger = logging.getLogger(__name__)
 
+BACKEND_DIR = Path(__file__).parent.parent.parent
+
 class RAGService:
     def __init__(self):
-        self.knowledge_file = Path(__file__).parent.parent.parent / "data" / "prodesk_knowledge.json"
-        self.knowledge_base = self.load_knowledge()
+        self.knowledge_file = BACKEND_DIR / settings.knowledge_file
+        self.snapshot_file = BACKEND_DIR / settings.knowledge_snapshot_path
+        self.vectorstore_dir = BACKEND_DIR / settings.vectorstore_path
+        self.knowledge_mtime = self._mtime()
+        # Remembers shingles of every page, so reloads only recount what changed
+        self.boilerplate = BoilerplateRemover()
+        
+        snapshot = self.open_snapshot()
+        if snapshot is not None:
+            # Compiled by the setup scripts; nothing to parse or index here
+            self.knowledge_base = []
+            self.knowledge = snapshot
+            self.ingest_report = snapshot.meta.get("report", {})
+            logger.info(f"Mapped knowledge snapshot {self.snapshot_file} ({len(snapshot.passages)} passages)")
+        else:
+            self.knowledge_base = self.load_knowledge()
+            self.knowledge, self.ingest_report = self._build_knowledge(self.knowledge_base)
+            logger.info(
+                f"Indexed {len(self.knowledge.passages)} passages from {len(self.knowledge_base)} pages "
+                f"({self.ingest_report['bytes_saved']} bytes of boilerplate, "
+                f"{self.ingest_report['duplicate_passages']} duplicate passages removed)"
+            )
+        self.vectors = self.open_vectors(self.knowledge)
+        response_cache.set_version(self.knowledge.version)
         self.groq_api_key = None
+        self._reload_lock = asyncio.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+        self._vector_build: Optional[asyncio.Task] = None
+        # Retrieval runs here, off the event loop; NumPy releases the GIL
+        # for the matrix product, so vector scoring overlaps BM25
+        self._retrieval_pool = ThreadPoolExecutor(
+            max_workers=settings.retrieval_threads,
+            thread_name_prefix="retrieval"
+        )
+    
+    @property
+    def passages(self) -> List[Dict]:
+        return self.knowledge.passages
+    
+    @property
+    def fingerprint(self) -> str:
+        return self.knowledge.version
+    
+    @staticmethod
+    def knowledge_fingerprint(entries: List[Dict]) -> str:
+        """Content hash of the knowledge base; changes invalidate cached answers"""
+        return knowledge_hash(entries)
     
-    def load_knowledge(self):
-        """Load knowledge from JSON"""
+    def _build_knowledge(self, entries: List[Dict], previous: Optional[KnowledgeIndex] = None) -> Tuple[KnowledgeIndex, Dict]:
+        """Strip boilerplate, then index; near-duplicate passages are dropped by the index"""
+        return build_corpus(entries, self.boilerplate, previous)
+    
+    def open_snapshot(self) -> Optional[SnapshotIndex]:
+        """The compiled snapshot, if there is one and the knowledge file has not changed since"""
+        if not self.snapshot_file.exists():
+            return None
         try:
-            if self.knowledge_file.exists():
+            snapshot = SnapshotIndex(str(self.snapshot_file))
+        except (SnapshotError, OSError, ValueError) as e:
+            logger.warning(f"Ignoring knowledge snapshot: {e}")
+            return None
+        
+        if self.knowledge_file.exists():
+            stat = source_stat(str(self.knowledge_file))
+            if any(snapshot.meta.get(k) != v for k, v in stat.items()):
+                logger.info("Knowledge file changed since the snapshot was compiled; indexing it instead")
+                snapshot.close()
+                return None
+        return snapshot
+    
+    
+    def load_knowledge(self, strict: bool = False):
+        """Load knowledge from JSON; strict raises instead of returning nothing"""
+        try:
+            if strict or self.knowledge_file.exists():
                 with open(self.knowledge_file, 'r', encoding='utf-8') as f:
                     return json.load(f)
         except Exception as e:
+            if strict:
+                raise
             logger.error(f"Failed to load knowledge: {e}")
         return []
     
-    async def get_response(self, query: str) -> str:
+    def open_vectors(self, knowledge) -> Optional[VectorIndex]:
+        """The saved vector store if it matches `knowledge`; None means build it in the background"""
+        if not settings.vector_search_enabled:
+            return None
+        vectors = load_vectors(str(self.vectorstore_dir), knowledge)
+        if vectors is not None:
+            logger.info(f"Vector index: {len(vectors)} passages x {vectors.dim} dims ({vectors.size_bytes} bytes)")
+        return vectors
+    
+    def start_vector_build(self):
+        """
+        Embed the passages in a worker thread when no saved store matched.
+        
+        Searches use BM25 alone until the vectors are swapped in.
+        """
+        if not settings.vector_search_enabled or self.vectors is not None:
+            return
+        if self._vector_build is None or self._vector_build.done():
+            self._vector_build = asyncio.create_task(self._build_vectors())
+    
+    async def _build_vectors(self):
+        # A reload during the build leaves vectors unset, so the loop embeds the new knowledge too
+        while self.vectors is None:
+            knowledge = self.knowledge
+            try:
+                vectors = await asyncio.to_thread(build_vectors, knowledge)
+            except Exception as e:
+                logger.error(f"Vector build failed: {e}")
+                return
+            if self.knowledge is knowledge:
+                self.vectors = vectors
+                logger.info(f"Built vector index: {len(vectors)} passages x {vectors.dim} dims ({vectors.size_bytes} bytes)")
+    
+    def _mtime(self) -> Optional[float]:
+        try:
+            return self.knowledge_file.stat().st_mtime
+        except OSError:
+            return None
+    
+    async def reload(self) -> Dict:
+        """
+        Re-read the knowledge file and swap in a new index.
+        
+        Loading and indexing run in a worker thread; unchanged entries reuse
+        their passages and tokens. Searches in flight keep the index they
+        started with, new ones see the replacement.
+        """
+        async with self._reload_lock:
+            mtime = self._mtime()
+            entries = await asyncio.to_thread(self.load_knowledge, True)
+            fingerprint = self.knowledge_fingerprint(entries)
+            current = self.knowledge
+            if fingerprint == current.version:
+                self.knowledge_mtime = mtime
+                return {"changed": False, "passages": len(current.passages), "entries": len(current.entries)}
+            
+            knowledge, report = await asyncio.to_thread(self._build_knowledge, entries, current)
+            vectors = await asyncio.to_thread(self.open_vectors, knowledge)
+            self.knowledge_base = entries
+            self.knowledge = knowledge
+            self.vectors = vectors
+            self.ingest_report = report
+            self.knowledge_mtime = mtime
+            response_cache.set_version(fingerprint)
+            self.start_vector_build()
+            
+            logger.info(
+                f"Reloaded knowledge: {len(knowledge.passages)} passages, "
+                f"{len(knowledge.entries)} entries ({knowledge.reused} unchanged)"
+            )
+            return {
+                "changed": True,
+                "passages": len(knowledge.passages),
+                "entries": len(knowledge.entries),
+                "reindexed": len(knowledge.entries) - knowledge.reused,
+                **report
+            }
+    
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            if self._mtime() == self.knowledge_mtime:
+                continue
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Knowledge reload failed: {e}")
+    
+    def start_watcher(self, interval: float):
+        """Poll the knowledge file's mtime and reload when it changes"""
+        if self._watcher is None and interval > 0:
+            self._watcher = asyncio.create_task(self._watch(interval))
+    
+    async def stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        if self._vector_build is not None:
+            self._vector_build.cancel()
+            self._vector_build = None
+    
+    async def get_response(
+        self,
+        query: str,
+        client_id: Optional[str] = None,
+        timer: Optional[StageTimer] = None,
+        tenant: Optional[KnowledgeIndex] = None
+    ) -> str:
         """Get AI response using simple keyword matching + Groq"""
+        timer = timer or StageTimer()
         try:
-            # Simple keyword search
-            context = self.search_knowledge(query)
+            # Hybrid keyword + vector retrieval
+            with timer.stage("retrieval"):
+                context = await self.search_knowledge(query, tenant, timer)
+            
+            # Repeated questions with the same context skip the LLM
+            with timer.stage("cache"):
+                cache_key = response_cache.make_key(client_id, query, context)
+                cached = await response_cache.get(cache_key)
+            if cached is not None:
+                return cached
             
             # Use Groq API
-            response = await self.generate_with_groq(query, context)
+            with timer.stage("llm"):
+                response = await groq_service.complete(
+                    self.build_messages(query, context),
+                    temperature=0.7,
+                    max_tokens=200
+                )
+            await response_cache.set(cache_key, response)
             return response
             
         except Exception as e:
             logger.error(f"Error: {e}")
             return self.fallback_response(query)
     
-    def search_knowledge(self, query: str) -> str:
-        """Simple keyword-based search - no embeddings needed"""
-        query_lower = query.lower()
-        keywords = query_lower.split()
+    @staticmethod
+    def _timed(fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        return result, (time.perf_counter() - started) * 1000
+    
+    def _fuse(self, knowledge, query: str, rankings: List[List[int]], timer: StageTimer) -> List[Tuple[int, float]]:
+        with timer.stage("retrieval_fusion"):
+            fused = reciprocal_rank_fusion(rankings, settings.rrf_k)[:settings.retrieval_candidates]
+        with timer.stage("retrieval_rerank"):
+            ranked = rerank(knowledge.query_terms(query), fused, knowledge.passage_tokens, settings.rerank_weight)
+        if ranked:
+            floor = settings.rerank_min_ratio * ranked[0][1]
+            ranked = [(doc_id, score) for doc_id, score in ranked if score >= floor]
+        return ranked
+    
+    async def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        tenant: Optional[KnowledgeIndex] = None,
+        timer: Optional[StageTimer] = None
+    ) -> List[Tuple[Dict, float]]:
+        """
+        Best passages for a query; a tenant's own knowledge ranks ahead of
+        the shared corpus.
+        
+        Shared passages come from BM25 and the vector index, searched side
+        by side on the retrieval pool and merged with reciprocal rank
+        fusion. The top candidates are then reranked by query term
+        proximity. Passages scoring well below the best one are dropped, so
+        the prompt only carries context that earns its tokens. All of it
+        runs off the event loop.
+        """
+        timer = timer or StageTimer()
+        loop = asyncio.get_running_loop()
+        pool = self._retrieval_pool
+        results = []
+        if tenant is not None:
+            results = await loop.run_in_executor(pool, tenant.search, query, top_k)
+        remaining = top_k - len(results)
+        if remaining <= 0:
+            return results
         
-        scored = []
-        for entry in self.knowledge_base:
-            content = entry.get('content', '').lower()
-            score = sum(1 for kw in keywords if kw in content)
-            if score > 0:
-                scored.append((score, entry))
+        knowledge, vectors = self.knowledge, self.vectors
+        candidates = settings.retrieval_candidates
+        jobs = [loop.run_in_executor(pool, self._timed, knowledge.search_ids, query, candidates)]
+        if vectors is not None:
+            jobs.append(loop.run_in_executor(
+                pool, self._timed, vectors.search_ids, query, candidates, settings.vector_min_score
+            ))
+        done = await asyncio.gather(*jobs)
         
-        scored.sort(reverse=True, key=lambda x: x[0])
-        top = [e for s, e in scored[:3]]
-        return "\n\n".join([e.get('content', '') for e in top])[:800]
+        rankings = []
+        for stage, (hits, ms) in zip(("retrieval_bm25", "retrieval_vector"), done):
+            timer.add(stage, ms)
+            rankings.append([doc_id for doc_id, _ in hits])
+        ranked = await loop.run_in_executor(pool, self._fuse, knowledge, query, rankings, timer)
+        return results + [(knowledge.passages[doc_id], score) for doc_id, score in ranked[:remaining]]
+    
+    async def search_knowledge(
+        self,
+        query: str,
+        tenant: Optional[KnowledgeIndex] = None,
+        timer: Optional[StageTimer] = None
+    ) -> str:
+        """Prompt context for a query: the top three passages from search()"""
+        top = [passage for passage, _ in await self.search(query, top_k=3, tenant=tenant, timer=timer)]
+        return build_context(top, max_chars=settings.context_max_chars)
+    
+    def build_messages(self, query: str, context: str) -> List[Dict[str, str]]:
+        """Prompt sent to the LLM for a query and its retrieved context"""
+        return [
+            {"role": "system", "content": f"You are Prodesk AI assistant. Context: {context}"},
+            {"role": "user", "content": query}
+        ]
     
-    async def generate_with_groq(self, query: str, context: str) -> str:
-        """Call Groq API directly"""
-        from ..config import settings
+    async def stream_response(
+        self,
+        query: str,
+        client_id: Optional[str] = None,
+        timer: Optional[StageTimer] = None,
+        tenant: Optional[KnowledgeIndex] = None
+    ) -> AsyncIterator[str]:
+        """Yield answer tokens as Groq streams them"""
+        timer = timer or StageTimer()
+        try:
+            with timer.stage("retrieval"):
+                context = await self.search_knowledge(query, tenant, timer)
+            with timer.stage("cache"):
+                cache_key = response_cache.make_key(client_id, query, context)
+                cached = await response_cache.get(cache_key)
+        except Exception as e:
+            # Same fallback as get_response; the SSE response has already started
+            logger.error(f"Error: {e}")
+            yield self.fallback_response(query)
+            return
+        if cached is not None:
+            timer.mark("first_token")
+            yield cached
+            return
         
+        parts = []
+        llm_started = time.perf_counter()
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.groq_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "llama-3.1-8b-instant",
-                        "messages": [
-                            {"role": "system", "content": f"You are Prodesk AI assistant. Context: {context}"},
-                            {"role": "user", "content": query}
-                        ],
-                        "max_tokens": 200,
-                        "temperature": 0.7
-                    },
-                    timeout=10.0
-                )
-                
-                if response.status_code == 200:
-                    return response.json()['choices'][0]['message']['content']
+            async for token in groq_service.stream(
+                self.build_messages(query, context),
+                temperature=0.7,
+                max_tokens=200
+            ):
+                timer.mark("first_token")
+                parts.append(token)
+                yield token
+            timer.add("llm", (time.perf_counter() - llm_started) * 1000)
+            if parts:
+                await response_cache.set(cache_key, "".join(parts))
         except Exception as e:
-            logger.error(f"Groq API error: {e}")
+            logger.error(f"Groq streaming error: {e}")
         
-        return self.fallback_response(query)
+        if not parts:
+            yield self.fallback_response(query)
     
     def fallback_response(self, query: str) -> str:
         """Fallback for common queries"""
@@ -0,0 +1,150 @@
+"""
+Answer cache for repeated questions
+In-process LRU with TTL and byte limits, optional Mongo tier shared by workers
+"""
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from ..config import settings
+from ..database import get_collection
+
+logger = logging.getLogger(__name__)
+
+NON_WORD_RE = re.compile(r"[^\w\s]+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold, drop punctuation and collapse whitespace"""
+    return " ".join(NON_WORD_RE.sub(" ", query.lower()).split())
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        ttl: float = 3600,
+        max_entries: int = 10000,
+        max_bytes: int = 32 * 1024 * 1024,
+        use_mongo: bool = False,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.use_mongo = use_mongo
+        self.version = ""
+        # key -> (expires_at, answer, size)
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.mongo_hits = 0
+        self.evictions = 0
+
+    def set_version(self, version: str):
+        """Tie entries to a knowledge base fingerprint; a new one drops them"""
+        if version != self.version:
+            self.version = version
+            self.clear()
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def make_key(self, tenant: Optional[str], query: str, context: str) -> str:
+        context_hash = hashlib.sha1(context.encode("utf-8")).hexdigest()
+        raw = f"{self.version}|{tenant or ''}|{normalize_query(query)}|{context_hash}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, answer, size = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self._bytes -= size
+            return None
+        self._entries.move_to_end(key)
+        return answer
+
+    def _set_local(self, key: str, answer: str, ttl: float):
+        size = len(key) + len(answer.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = (time.monotonic() + ttl, answer, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look up an answer locally, then in the shared Mongo tier"""
+        answer = self._get_local(key)
+        if answer is not None:
+            self.hits += 1
+            return answer
+
+        collection = get_collection("response_cache") if self.use_mongo else None
+        if collection is not None:
+            try:
+                doc = await collection.find_one(
+                    {"_id": key, "expires_at": {"$gt": datetime.utcnow()}},
+                    {"answer": 1, "expires_at": 1}
+                )
+                if doc:
+                    remaining = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+                    self._set_local(key, doc["answer"], remaining)
+                    self.hits += 1
+                    self.mongo_hits += 1
+                    return doc["answer"]
+            except Exception as e:
+                logger.warning(f"Response cache lookup failed: {e}")
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, answer: str):
+        """Store an answer in both tiers"""
+        self._set_local(key, answer, self.ttl)
+
+        collection = get_collection("response_cache") if self.use_mongo else None
+        if collection is not None:
+            try:
+                await collection.replace_one(
+                    {"_id": key},
+                    {
+                        "answer": answer,
+                        "version": self.version,
+                        "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)
+                    },
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"Response cache write failed: {e}")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "mongo_hits": self.mongo_hits,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(
+    ttl=settings.response_cache_ttl,
+    max_entries=settings.response_cache_max_entries,
+    max_bytes=settings.response_cache_max_bytes,
+    use_mongo=settings.response_cache_mongo,
+)
@@ -1,16 +1,34 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
 import json
-from typing import List, Dict
+import os
+from typing import List, Dict, Optional
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from .crawler import crawl_site
+from .extraction import extract
+from .fetcher import Fetcher
 
 logger = logging.getLogger(__name__)
 
+def load_previous(filepath: str) -> List[Dict]:
+    """Pages from an earlier run, reused for URLs that have not changed"""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return data.get("pages", []) if isinstance(data, dict) else data
+
+def state_path_for(filepath: str) -> str:
+    """Where fetch validators for an output file are kept"""
+    return f"{os.path.splitext(filepath)[0]}.fetch_state.json"
+
 class WebScraper:
     """Scrape Prodesk website for knowledge base"""
-    
-    def __init__(self, base_url: str = "https://prodesk.in"):
+
+    def __init__(self, base_url: str = "https://prodesk.in", **fetch_options):
         self.base_url = base_url
+        self.fetch_options = fetch_options
         self.pages = [
             "/",
             "/services",
@@ -18,58 +36,78 @@ class WebScraper:
             "/who-we-are-1",
             "/what-we-do-1",
         ]
-    
-    def scrape_page(self, url: str) -> Dict[str, str]:
-        """Scrape single page"""
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove unwanted elements
-            for element in soup(['script', 'style', 'nav', 'footer', 'header']):
-                element.decompose()
-            
-            # Extract text
-            text = soup.get_text(separator=' ', strip=True)
-            
-            # Clean text
-            text = ' '.join(text.split())
-            
-            return {
-                "url": url,
-                "content": text,
-                "source": url.replace(self.base_url, "")
-            }
-        except Exception as e:
-            logger.error(f"Error scraping {url}: {e}")
-            return {"url": url, "content": "", "source": ""}
-    
+
+    def parse_page(self, url: str, content: bytes) -> Dict[str, str]:
+        """Extract text from a fetched page"""
+        text = extract(content)["text"]
+
+        return {
+            "url": url,
+            "content": text,
+            "source": url.replace(self.base_url, ""),
+            "word_count": len(text.split())
+        }
+
+    async def scrape(self, previous: Optional[List[Dict]] = None, state_path: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Fetch all pages concurrently.
+
+        Pages that answer 304 (or an identical body) reuse their entry from
+        `previous` without being parsed again.
+        """
+        previous_by_url = {page["url"]: page for page in previous or [] if page.get("content")}
+        urls = [f"{self.base_url}{page}" for page in self.pages]
+        scraped = {}
+
+        async with Fetcher(state_path=state_path, **self.fetch_options) as fetcher:
+            async for result in fetcher.fetch_all(urls, conditional=previous_by_url):
+                if result.unchanged:
+                    scraped[result.url] = previous_by_url[result.url]
+                elif result.ok:
+                    logger.info(f"Scraped: {result.url}")
+                    scraped[result.url] = self.parse_page(result.url, result.content)
+                elif result.url in previous_by_url:
+                    logger.warning(f"Keeping previous content for {result.url}")
+                    scraped[result.url] = previous_by_url[result.url]
+            logger.info(f"Fetch stats: {fetcher.stats}")
+
+        return [scraped[url] for url in urls if scraped.get(url, {}).get("content")]
+
     def scrape_all(self) -> List[Dict[str, str]]:
         """Scrape all pages"""
-        knowledge_base = []
-        
-        for page in self.pages:
-            url = f"{self.base_url}{page}"
-            logger.info(f"Scraping: {url}")
-            
-            data = self.scrape_page(url)
-            if data["content"]:
-                knowledge_base.append(data)
-        
-        return knowledge_base
-    
+        return asyncio.run(self.scrape())
+
     def save_to_file(self, filepath: str):
-        """Scrape and save to JSON file"""
-        knowledge = self.scrape_all()
-        
+        """Scrape and save to JSON file, refreshing only pages that changed"""
+        knowledge = asyncio.run(self.scrape(load_previous(filepath), state_path_for(filepath)))
+
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(knowledge, f, ensure_ascii=False, indent=2)
-        
+
         logger.info(f"Saved knowledge base to {filepath}")
         return knowledge
 
+    def crawl_to_file(self, filepath: str, max_pages: int = 200, max_depth: int = 3, workers: int = 1) -> int:
+        """Crawl the whole site from base_url and sitemap.xml, streaming pages to JSON"""
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            count = asyncio.run(crawl_site(
+                self.base_url,
+                self.parse_page,
+                filepath,
+                previous=load_previous(filepath),
+                state_path=state_path_for(filepath),
+                max_pages=max_pages,
+                max_depth=max_depth,
+                fetch_options=self.fetch_options,
+                executor=executor
+            ))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        logger.info(f"Saved {count} crawled pages to {filepath}")
+        return count
+
 # Standalone script usage
 if __name__ == "__main__":
     scraper = WebScraper()
@@ -0,0 +1,176 @@
+"""
+In-memory inverted index with BM25 ranking
+Built once per corpus, queried per chat message
+"""
+import heapq
+import math
+import re
+from collections import Counter
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been
+before being below between both but by can could did do does doing down during
+each few for from further had has have having he her here hers herself him
+himself his how i if in into is it its itself just me more most my myself no nor
+not of off on once only or other our ours ourselves out over own same she should
+so some such than that the their theirs them themselves then there these they
+this those through to too under until up very was we were what when where which
+while who whom why will with would you your yours yourself yourselves
+""".split())
+
+
+def normalize_token(token: str) -> str:
+    """Cheap plural folding so 'services' matches 'service'"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on non-alphanumerics, drop stopwords and single chars"""
+    return [
+        normalize_token(tok)
+        for tok in TOKEN_RE.findall(text.lower())
+        if len(tok) > 1 and tok not in STOPWORDS
+    ]
+
+
+def impact_top_k(
+    postings: Sequence[Tuple[Sequence[int], Sequence[float]]],
+    score: Callable[[int], float],
+    top_k: int,
+    block: int = 32
+) -> List[Tuple[int, float]]:
+    """
+    Exact top_k over impact-ordered postings (Fagin's threshold algorithm).
+
+    Lists are read `block` postings at a time, always from the list whose
+    next impact is highest, and each newly seen doc gets its full score
+    from `score`. Once the k-th best score reaches the sum of the next
+    unread impacts, no unseen doc can enter the top k and reading stops,
+    usually after a short prefix of each list.
+    """
+    top: List[Tuple[float, int]] = []
+    seen = set()
+    positions = [0] * len(postings)
+    heads = [weights[0] if len(weights) else 0.0 for _, weights in postings]
+    while True:
+        threshold = sum(heads)
+        if threshold <= 0 or (len(top) == top_k and top[0][0] >= threshold):
+            break
+        i = max(range(len(heads)), key=heads.__getitem__)
+        doc_ids, weights = postings[i]
+        start = positions[i]
+        end = positions[i] = start + block
+        heads[i] = weights[end] if end < len(weights) else 0.0
+        for doc_id in doc_ids[start:end]:
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            doc_score = score(doc_id)
+            if len(top) < top_k:
+                heapq.heappush(top, (doc_score, doc_id))
+            elif doc_score > top[0][0]:
+                heapq.heapreplace(top, (doc_score, doc_id))
+    return [(doc_id, doc_score) for doc_score, doc_id in sorted(top, reverse=True)]
+
+
+class SearchIndex:
+    """
+    Inverted index scored with Okapi BM25.
+
+    Postings store precomputed per-document impacts (idf * saturated tf),
+    sorted by impact, so a query reads only the head of each list and
+    stops as soon as the top k are settled (see impact_top_k).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths: List[int] = []
+        self._term_freqs: Dict[str, Dict[int, int]] = {}
+        self._impacts: Dict[str, Tuple[List[int], List[float]]] = {}
+        self.idf: Dict[str, float] = {}
+        self.norms: List[float] = []
+
+    @classmethod
+    def build(cls, documents: Iterable[str], **kwargs) -> "SearchIndex":
+        """Build an index where doc ids are positions in `documents`"""
+        index = cls(**kwargs)
+        for text in documents:
+            index._add_tokens(tokenize(text))
+        index._compile()
+        return index
+
+    @classmethod
+    def from_tokens(cls, token_lists: Iterable[List[str]], **kwargs) -> "SearchIndex":
+        """Build from already tokenized documents, so callers can reuse tokenization"""
+        index = cls(**kwargs)
+        for tokens in token_lists:
+            index._add_tokens(tokens)
+        index._compile()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def _add_tokens(self, tokens: List[str]) -> int:
+        doc_id = len(self.doc_lengths)
+        self.doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            self._term_freqs.setdefault(term, {})[doc_id] = tf
+        return doc_id
+
+    def _compile(self):
+        """Precompute BM25 impacts for every posting"""
+        n_docs = len(self.doc_lengths)
+        avgdl = (sum(self.doc_lengths) / n_docs) if n_docs else 0.0
+        k1, b = self.k1, self.b
+        norms = [
+            k1 * (1 - b + b * (dl / avgdl)) if avgdl else k1
+            for dl in self.doc_lengths
+        ]
+
+        impacts = {}
+        idfs = {}
+        for term, postings in self._term_freqs.items():
+            df = len(postings)
+            idf = idfs[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scored = sorted(
+                ((doc_id, idf * tf * (k1 + 1) / (tf + norms[doc_id])) for doc_id, tf in postings.items()),
+                key=itemgetter(1),
+                reverse=True,
+            )
+            impacts[term] = ([d for d, _ in scored], [w for _, w in scored])
+        self._impacts = impacts
+        self.idf = idfs
+        self.norms = norms
+
+    def postings(self) -> Iterator[Tuple[str, List[int], List[float]]]:
+        """(term, doc ids, impacts) in term order, impacts best first"""
+        for term in sorted(self._impacts):
+            doc_ids, weights = self._impacts[term]
+            yield term, doc_ids, weights
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """Return up to top_k (doc_id, score) pairs, best first"""
+        terms = sorted(t for t in set(tokenize(query)) if t in self._impacts)
+        if not terms or top_k <= 0:
+            return []
+        k1, norms = self.k1, self.norms
+        scorers = [(self._term_freqs[t], self.idf[t]) for t in terms]
+
+        def score(doc_id: int) -> float:
+            # Same expression as the stored impacts, so scores match exactly
+            total = 0.0
+            for freqs, idf in scorers:
+                tf = freqs.get(doc_id)
+                if tf:
+                    total += idf * tf * (k1 + 1) / (tf + norms[doc_id])
+            return total
+
+        return impact_top_k([self._impacts[t] for t in terms], score, top_k)
@@ -0,0 +1,316 @@
+"""
+Versioned binary snapshot of the shared knowledge index
+Compiled by the setup scripts and opened by workers with mmap, so startup
+does no JSON parsing or indexing and forked workers share the file's pages
+through the OS page cache.
+
+Layout (little-endian), every section 8-byte aligned:
+    header          magic, format version, counts, fingerprint, section table
+    term offsets    uint32[n_terms + 1] into the term blob
+    term blob       sorted UTF-8 terms
+    term postings   uint64[n_terms + 1] into the postings arrays
+    posting docs    uint32[n_postings], per term best impact first
+    posting weights float32[n_postings], precomputed BM25 impacts
+    passage offsets uint64[n_passages + 1] into the passage blob
+    passage blob    one JSON object per passage (content and metadata)
+    token offsets   uint64[n_passages + 1] into the token ids
+    token ids       uint32 term ids of each passage's tokens, in order
+    doc terms       uint64[n_passages + 1] offsets, then per passage its sorted
+                    distinct term ids (uint32) and their frequencies (uint32)
+    term idf        float64[n_terms] BM25 idf
+    doc norms       float64[n_passages] BM25 length normalization
+    meta            JSON: source file stat, ingest report
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Sequence
+from typing import Dict, List, Optional, Set, Tuple
+from .dedup import BoilerplateRemover
+from .knowledge_index import KnowledgeIndex, build_corpus
+from .search_index import impact_top_k, tokenize
+
+MAGIC = b"PDKSNAP\0"
+FORMAT_VERSION = 4
+SECTIONS = (
+    "term_offsets", "term_blob", "term_postings", "posting_docs",
+    "posting_weights", "passage_offsets", "passage_blob",
+    "token_offsets", "token_ids", "doc_term_offsets", "doc_terms", "doc_tfs",
+    "term_idf", "doc_norms", "meta",
+)
+# magic, format, n_terms, n_passages, n_postings, fingerprint, (offset, length) per section
+HEADER = struct.Struct("<8sIIIQ40s" + "QQ" * len(SECTIONS))
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def source_stat(path: str) -> Dict:
+    """Size and mtime of the JSON a snapshot was compiled from"""
+    st = os.stat(path)
+    return {"source_size": st.st_size, "source_mtime_ns": st.st_mtime_ns}
+
+
+def compile_snapshot(knowledge_file: str, snapshot_path: str) -> Dict:
+    """Clean, index and snapshot a knowledge JSON file; returns the snapshot meta"""
+    with open(knowledge_file, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    knowledge, report = build_corpus(entries, BoilerplateRemover())
+    meta = {**source_stat(knowledge_file), "pages": len(entries), "report": report}
+    write_snapshot(snapshot_path, knowledge, meta)
+    return {**meta, "passages": len(knowledge.passages), "bytes": os.path.getsize(snapshot_path)}
+
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+
+def write_snapshot(path: str, knowledge: KnowledgeIndex, meta: Optional[Dict] = None):
+    """Serialize a built index; the file is replaced atomically"""
+    if sys.byteorder != "little":
+        raise SnapshotError("snapshots are written on little-endian hosts only")
+
+    term_offsets = array("I", [0])
+    term_blob = bytearray()
+    term_postings = array("Q", [0])
+    posting_docs = array("I")
+    posting_weights = array("f")
+    term_ids: Dict[str, int] = {}
+    term_idf = array("d")
+    for term, doc_ids, weights in knowledge.index.postings():
+        term_ids[term] = len(term_ids)
+        term_idf.append(knowledge.index.idf[term])
+        term_blob += term.encode("utf-8")
+        term_offsets.append(len(term_blob))
+        posting_docs.extend(doc_ids)
+        posting_weights.extend(weights)
+        term_postings.append(len(posting_docs))
+
+    passage_offsets = array("Q", [0])
+    passage_blob = bytearray()
+    for passage in knowledge.passages:
+        passage_blob += json.dumps(passage, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        passage_offsets.append(len(passage_blob))
+
+    # Passage tokens as term ids, so the reranker compares ints straight off the map
+    token_offsets = array("Q", [0])
+    token_ids = array("I")
+    # Forward index for scoring: each passage's distinct term ids, sorted, with their tf
+    doc_term_offsets = array("Q", [0])
+    doc_terms = array("I")
+    doc_tfs = array("I")
+    for tokens in knowledge.tokens:
+        ids = [term_ids[token] for token in tokens]
+        token_ids.extend(ids)
+        token_offsets.append(len(token_ids))
+        for term_id, tf in sorted(Counter(ids).items()):
+            doc_terms.append(term_id)
+            doc_tfs.append(tf)
+        doc_term_offsets.append(len(doc_terms))
+
+    doc_norms = array("d", knowledge.index.norms)
+
+    meta_blob = json.dumps({
+        **(meta or {}), "duplicates": knowledge.duplicates, "k1": knowledge.index.k1
+    }).encode("utf-8")
+
+    payloads = [
+        term_offsets.tobytes(), bytes(term_blob), term_postings.tobytes(), posting_docs.tobytes(),
+        posting_weights.tobytes(), passage_offsets.tobytes(), bytes(passage_blob),
+        token_offsets.tobytes(), token_ids.tobytes(), doc_term_offsets.tobytes(), doc_terms.tobytes(),
+        doc_tfs.tobytes(), term_idf.tobytes(), doc_norms.tobytes(), meta_blob,
+    ]
+    table = []
+    offset = HEADER.size + _pad(HEADER.size)
+    for payload in payloads:
+        table += [offset, len(payload)]
+        offset += len(payload) + _pad(len(payload))
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, len(term_offsets) - 1, len(knowledge.passages), len(posting_docs),
+        knowledge.version.encode("ascii")[:40].ljust(40, b"\0"), *table,
+    )
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header + b"\0" * _pad(len(header)))
+        for payload in payloads:
+            f.write(payload + b"\0" * _pad(len(payload)))
+    # Workers that mapped the old file keep its inode until they close it
+    os.replace(tmp, path)
+
+
+class SnapshotPassages(Sequence):
+    """Passages decoded on access from the mapped blob"""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return json.loads(bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]))
+
+
+class SnapshotIndex:
+    """
+    Read-only index over a mapped snapshot.
+
+    Quacks like KnowledgeIndex for searching; it carries no per-entry state,
+    so the first rebuild after opening one reindexes everything.
+    """
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise SnapshotError("snapshots can only be mapped on little-endian hosts")
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._exports: List[memoryview] = []
+        try:
+            self._open()
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self):
+        if len(self._mmap) < HEADER.size:
+            raise SnapshotError(f"{self.path} is truncated")
+        magic, fmt, n_terms, n_passages, n_postings, fingerprint, *table = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path} is not a knowledge snapshot")
+        if fmt != FORMAT_VERSION:
+            raise SnapshotError(f"{self.path} has format {fmt}, expected {FORMAT_VERSION}")
+
+        view = memoryview(self._mmap)
+        # Every view must be released before the map can be closed
+        self._exports.append(view)
+        sections = {}
+        for name, (offset, length) in zip(SECTIONS, zip(table[::2], table[1::2])):
+            if offset + length > len(self._mmap):
+                raise SnapshotError(f"{self.path} is truncated")
+            sections[name] = view[offset:offset + length]
+            self._exports.append(sections[name])
+
+        self.version = fingerprint.rstrip(b"\0").decode("ascii")
+        self.n_terms = n_terms
+        self._term_offsets = self._cast(sections["term_offsets"], "I")
+        self._term_blob = sections["term_blob"]
+        self._term_postings = self._cast(sections["term_postings"], "Q")
+        self._docs = self._cast(sections["posting_docs"], "I")
+        self._weights = self._cast(sections["posting_weights"], "f")
+        self.passages = SnapshotPassages(self._cast(sections["passage_offsets"], "Q"), sections["passage_blob"])
+        self._token_offsets = self._cast(sections["token_offsets"], "Q")
+        self._token_ids = self._cast(sections["token_ids"], "I")
+        self._doc_term_offsets = self._cast(sections["doc_term_offsets"], "Q")
+        self._doc_terms = self._cast(sections["doc_terms"], "I")
+        self._doc_tfs = self._cast(sections["doc_tfs"], "I")
+        self._idf = self._cast(sections["term_idf"], "d")
+        self._norms = self._cast(sections["doc_norms"], "d")
+        self.meta = json.loads(bytes(sections["meta"]) or b"{}")
+        if (
+            len(self.passages) != n_passages
+            or len(self._token_offsets) != n_passages + 1
+            or len(self._doc_term_offsets) != n_passages + 1
+            or len(self._doc_terms) != len(self._doc_tfs)
+            or len(self._norms) != n_passages
+            or len(self._idf) != n_terms
+            or len(self._docs) != n_postings
+        ):
+            raise SnapshotError(f"{self.path} has inconsistent section sizes")
+
+        self.entries: Dict = {}
+        self.reused = 0
+        self.duplicates = self.meta.get("duplicates", 0)
+        self.k1 = self.meta.get("k1", 1.5)
+        self.size_bytes = 0
+
+    def _cast(self, section: memoryview, fmt: str) -> memoryview:
+        typed = section.cast(fmt)
+        self._exports.append(typed)
+        return typed
+
+    def _term_id(self, term: bytes) -> int:
+        """Binary search of the sorted term dictionary; -1 if absent"""
+        offsets, blob = self._term_offsets, self._term_blob
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = bytes(blob[offsets[mid]:offsets[mid + 1]])
+            if probe < term:
+                lo = mid + 1
+            elif probe > term:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def search_ids(self, query: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """Exact BM25 top_k; a doc's term frequencies come from the forward index"""
+        term_ids = sorted({self._term_id(t.encode("utf-8")) for t in tokenize(query)} - {-1})
+        if not term_ids or top_k <= 0:
+            return []
+        postings = [
+            (self._docs[start:end], self._weights[start:end])
+            for start, end in ((self._term_postings[t], self._term_postings[t + 1]) for t in term_ids)
+        ]
+        k1, norms = self.k1, self._norms
+        offsets, doc_terms, doc_tfs = self._doc_term_offsets, self._doc_terms, self._doc_tfs
+        scorers = [(term_id, self._idf[term_id]) for term_id in term_ids]
+
+        def score(doc_id: int) -> float:
+            # Binary search within the doc's range of the mapped arrays; nothing is copied
+            lo, hi = offsets[doc_id], offsets[doc_id + 1]
+            total = 0.0
+            for term_id, idf in scorers:
+                i = bisect_left(doc_terms, term_id, lo, hi)
+                if i < hi and doc_terms[i] == term_id:
+                    tf = doc_tfs[i]
+                    total += idf * tf * (k1 + 1) / (tf + norms[doc_id])
+                    lo = i + 1
+            return total
+
+        try:
+            return impact_top_k(postings, score, top_k)
+        finally:
+            # Slices export the map; release them so close() can unmap it
+            for doc_ids, weights in postings:
+                doc_ids.release()
+                weights.release()
+
+    def query_terms(self, query: str) -> Set[int]:
+        """Term ids of the query; terms not in the dictionary get ids no passage holds"""
+        return {
+            term_id if term_id >= 0 else -1 - i
+            for i, term_id in enumerate(self._term_id(t.encode("utf-8")) for t in set(tokenize(query)))
+        }
+
+    def passage_tokens(self, doc_id: int) -> List[int]:
+        """A passage's tokens as term ids, read from the map without decoding text"""
+        return self._token_ids[self._token_offsets[doc_id]:self._token_offsets[doc_id + 1]].tolist()
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[Dict, float]]:
+        return [(self.passages[doc_id], score) for doc_id, score in self.search_ids(query, top_k)]
+
+    def close(self):
+        for export in reversed(self._exports):
+            export.release()
+        self._exports = []
+        self._mmap.close()
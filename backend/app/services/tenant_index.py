@@ -0,0 +1,106 @@
+"""
+Per-tenant retrieval indexes built from a client's custom_knowledge
+Indexes are built lazily on a tenant's first chat, off the event loop, and
+kept in an LRU bounded by entry count and estimated memory.
+"""
+import asyncio
+import logging
+from bson import ObjectId
+from collections import OrderedDict
+from typing import Dict, Optional
+from ..config import settings
+from ..database import get_collection
+from .knowledge_index import KnowledgeIndex, knowledge_hash
+
+logger = logging.getLogger(__name__)
+
+EMPTY_KNOWLEDGE_HASH = knowledge_hash([])
+
+class TenantIndexCache:
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._indexes: "OrderedDict[str, KnowledgeIndex]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.builds = 0
+        self.evictions = 0
+
+    async def get(self, client: Dict) -> Optional[KnowledgeIndex]:
+        """The client's index, built or refreshed on demand; None without custom knowledge"""
+        client_id = str(client["_id"])
+        version = client.get("knowledge_hash")
+        if version == EMPTY_KNOWLEDGE_HASH:
+            return None
+
+        cached = self._indexes.get(client_id)
+        # Clients created before knowledge hashing carry no version; trust the cache
+        if cached is not None and (version is None or cached.version == version):
+            self._indexes.move_to_end(client_id)
+            self.hits += 1
+            return cached if len(cached.passages) else None
+
+        # Collapse concurrent builds for the same tenant
+        pending = self._inflight.get(client_id)
+        if pending is not None:
+            return await pending
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[client_id] = future
+        try:
+            index = await self._build(client_id, cached)
+            future.set_result(index)
+            return index
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(client_id, None)
+
+    async def _build(self, client_id: str, previous: Optional[KnowledgeIndex]) -> Optional[KnowledgeIndex]:
+        clients_collection = get_collection("clients")
+        doc = await clients_collection.find_one(
+            {"_id": ObjectId(client_id)},
+            {"custom_knowledge": 1, "knowledge_hash": 1}
+        )
+        knowledge = (doc or {}).get("custom_knowledge") or []
+        version = (doc or {}).get("knowledge_hash") or knowledge_hash(knowledge)
+
+        # Chunking and tokenizing is CPU work; keep it off the event loop
+        index = await asyncio.to_thread(KnowledgeIndex.build, version, knowledge, previous, "custom")
+        self.builds += 1
+        logger.info(
+            f"Built knowledge index for client {client_id}: {len(index.passages)} passages, "
+            f"{len(index.entries)} entries ({index.reused} reused)"
+        )
+
+        self._store(client_id, index)
+        return index if len(index.passages) else None
+
+    def _store(self, client_id: str, index: KnowledgeIndex):
+        old = self._indexes.pop(client_id, None)
+        if old is not None:
+            self.size_bytes -= old.size_bytes
+        self._indexes[client_id] = index
+        self.size_bytes += index.size_bytes
+        while len(self._indexes) > 1 and (len(self._indexes) > self.max_entries or self.size_bytes > self.max_bytes):
+            _, evicted = self._indexes.popitem(last=False)
+            self.size_bytes -= evicted.size_bytes
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        return {
+            "tenants": len(self._indexes),
+            "bytes": self.size_bytes,
+            "hits": self.hits,
+            "builds": self.builds,
+            "evictions": self.evictions,
+        }
+
+
+tenant_indexes = TenantIndexCache(
+    max_entries=settings.tenant_index_max_entries,
+    max_bytes=settings.tenant_index_max_bytes,
+)
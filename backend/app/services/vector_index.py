@@ -0,0 +1,279 @@
+"""
+Dense passage retrieval on the CPU
+Passages are embedded with hashed TF-IDF features (words and character
+trigrams) reduced by a truncated SVD, i.e. latent semantic analysis. Terms
+that co-occur across passages end up close together, so a query can reach
+passages that never use its exact words. No model download, no GPU.
+"""
+import json
+import logging
+import os
+import zlib
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from ..config import settings
+from .search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+def features(text: str, char_ngram: int = 3) -> List[str]:
+    """Word tokens plus character n-grams of each word, so word forms overlap"""
+    tokens = tokenize(text)
+    grams = list(tokens)
+    for token in tokens:
+        padded = f"<{token}>"
+        grams += [f"#{padded[i:i + char_ngram]}" for i in range(len(padded) - char_ngram + 1)]
+    return grams
+
+
+class HashedTfidf:
+    """TF-IDF over hashed feature buckets; no vocabulary to store"""
+
+    def __init__(self, n_features: int = 1 << 14, idf: Optional[np.ndarray] = None):
+        self.n_features = n_features
+        self.idf = idf
+
+    def hash_counts(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(bucket ids, counts) of one text"""
+        grams = features(text)
+        # crc32 is stable across processes, unlike hash()
+        buckets = np.fromiter(
+            (zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint32, count=len(grams)
+        ) % self.n_features
+        return np.unique(buckets, return_counts=True)
+
+    def fit(self, rows: Sequence[Tuple[np.ndarray, np.ndarray]]):
+        df = np.zeros(self.n_features, dtype=np.float64)
+        for ids, _ in rows:
+            df[ids] += 1
+        self.idf = (np.log((1 + len(rows)) / (1 + df)) + 1).astype(np.float32)
+
+    def dense(self, rows: Sequence[Tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+        """L2-normalized sublinear TF-IDF rows as a dense float32 matrix"""
+        matrix = np.zeros((len(rows), self.n_features), dtype=np.float32)
+        for i, (ids, counts) in enumerate(rows):
+            # Normalize the non-zeros before scattering them; no dense temporaries
+            values = (1 + np.log(counts)) * self.idf[ids]
+            norm = np.sqrt(values @ values)
+            if norm > 0:
+                matrix[i, ids] = values / norm
+        return matrix
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+class VectorIndex:
+    """
+    Passage embeddings as one row-major matrix, scored with a single
+    matrix-vector product.
+
+    With `quantized`, rows are stored as int8 with a per-row scale, a quarter
+    of the float32 size; scores are computed in blocks so the int8 matrix is
+    never upcast as a whole.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        tfidf: HashedTfidf,
+        components: np.ndarray,
+        vectors: np.ndarray,
+        scales: Optional[np.ndarray] = None,
+        block_rows: int = 65536
+    ):
+        self.version = version
+        self.tfidf = tfidf
+        # (dim, n_features) projection onto the top singular directions
+        self.components = components
+        self.vectors = vectors
+        self.scales = scales
+        self.block_rows = block_rows
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def quantized(self) -> bool:
+        return self.scales is not None
+
+    @property
+    def size_bytes(self) -> int:
+        return self.vectors.nbytes + self.components.nbytes + (self.scales.nbytes if self.quantized else 0)
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    @classmethod
+    def build(
+        cls,
+        version: str,
+        texts: Sequence[str],
+        dim: int = 256,
+        n_features: int = 1 << 14,
+        quantize: bool = False,
+        fit_sample: int = 2000,
+        batch_size: int = 256,
+        seed: int = 0
+    ) -> "VectorIndex":
+        """
+        Fit TF-IDF and SVD on (a sample of) the passages, then embed them in batches.
+
+        The rank is capped at half the fitted passages: keeping every
+        direction would reproduce plain TF-IDF and lose the smoothing that
+        relates co-occurring terms.
+        """
+        tfidf = HashedTfidf(n_features)
+        rows = [tfidf.hash_counts(text) for text in texts]
+        tfidf.fit(rows)
+
+        rng = np.random.default_rng(seed)
+        sample = rows
+        if len(rows) > fit_sample:
+            sample = [rows[i] for i in rng.choice(len(rows), fit_sample, replace=False)]
+        components = np.zeros((0, n_features), dtype=np.float32)
+        if sample:
+            # Eigenvectors of the small Gram matrix give the right singular vectors
+            # without decomposing the wide (passages x features) matrix itself.
+            # The sample is densified one batch at a time, so the peak stays at a
+            # few (batch_size x n_features) blocks rather than the whole sample.
+            m = len(sample)
+            gram = np.empty((m, m), dtype=np.float32)
+            for i in range(0, m, batch_size):
+                left = tfidf.dense(sample[i:i + batch_size])
+                for j in range(i, m, batch_size):
+                    right = left if j == i else tfidf.dense(sample[j:j + batch_size])
+                    block = left @ right.T
+                    gram[i:i + len(left), j:j + len(right)] = block
+                    gram[j:j + len(right), i:i + len(left)] = block.T
+            eigvals, eigvecs = np.linalg.eigh(gram)
+            del gram
+            order = np.argsort(eigvals)[::-1][:max(1, min(dim, m // 2))]
+            order = order[eigvals[order] > 1e-6]
+            basis = eigvecs[:, order] / np.sqrt(eigvals[order])
+            components = np.zeros((len(order), n_features), dtype=np.float32)
+            for i in range(0, m, batch_size):
+                components += basis[i:i + batch_size].T @ tfidf.dense(sample[i:i + batch_size])
+
+        vectors = np.empty((len(rows), components.shape[0]), dtype=np.float32)
+        for start in range(0, len(rows), batch_size):
+            batch = tfidf.dense(rows[start:start + batch_size])
+            vectors[start:start + batch_size] = _normalize(batch @ components.T)
+
+        scales = None
+        if quantize:
+            vectors, scales = cls.quantize(vectors)
+        return cls(version, tfidf, components, vectors, scales)
+
+    @staticmethod
+    def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Symmetric per-row int8 quantization; returns (codes, scales)"""
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def embed(self, text: str) -> np.ndarray:
+        """Project a query using only its non-zero feature buckets"""
+        ids, counts = self.tfidf.hash_counts(text)
+        weights = (1 + np.log(counts)) * self.tfidf.idf[ids]
+        return _normalize(self.components[:, ids] @ weights.astype(np.float32))
+
+    def scores(self, query_vector: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every passage to an embedded query"""
+        if not self.quantized:
+            return self.vectors @ query_vector
+        out = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), self.block_rows):
+            end = start + self.block_rows
+            out[start:end] = self.vectors[start:end] @ query_vector
+        return out * self.scales
+
+    def search_ids(self, query: str, top_k: int = 3, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """Up to top_k (row, score) pairs at or above min_score, best first"""
+        if len(self) == 0 or top_k <= 0 or self.dim == 0:
+            return []
+        scores = self.scores(self.embed(query))
+        if top_k < len(scores):
+            # Linear-time selection; only the k winners get sorted
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top if scores[i] >= min_score]
+
+    def save(self, path: str):
+        """Write the store as .npy files plus a meta.json written last"""
+        os.makedirs(path, exist_ok=True)
+        arrays = {
+            "vectors": self.vectors,
+            "components": self.components,
+            "idf": self.tfidf.idf,
+        }
+        if self.quantized:
+            arrays["scales"] = self.scales
+        for name, array in arrays.items():
+            tmp = os.path.join(path, f"{name}.npy.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp, os.path.join(path, f"{name}.npy"))
+
+        meta = {
+            "format": FORMAT_VERSION,
+            "version": self.version,
+            "passages": len(self),
+            "dim": self.dim,
+            "n_features": self.tfidf.n_features,
+            "quantized": self.quantized,
+        }
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+
+    @classmethod
+    def load(cls, path: str) -> "VectorIndex":
+        """Open a saved store; the passage vectors are memory-mapped"""
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{path} has format {meta.get('format')}, expected {FORMAT_VERSION}")
+
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        components = np.load(os.path.join(path, "components.npy"))
+        idf = np.load(os.path.join(path, "idf.npy"))
+        scales = np.load(os.path.join(path, "scales.npy")) if meta["quantized"] else None
+        if vectors.shape != (meta["passages"], meta["dim"]) or idf.shape != (meta["n_features"],):
+            raise ValueError(f"{path} does not match its meta.json")
+        return cls(meta["version"], HashedTfidf(meta["n_features"], idf), components, vectors, scales)
+
+
+def build_vectors(knowledge) -> VectorIndex:
+    """Embed the passages of a KnowledgeIndex or SnapshotIndex, one row per passage"""
+    return VectorIndex.build(
+        knowledge.version,
+        [passage["content"] for passage in knowledge.passages],
+        dim=settings.vector_dim,
+        quantize=settings.vector_quantize
+    )
+
+
+def load_vectors(path: str, knowledge) -> Optional[VectorIndex]:
+    """The saved store at `path` if it was built from this knowledge, else None"""
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    try:
+        vectors = VectorIndex.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring vector store {path}: {e}")
+        return None
+    if vectors.version != knowledge.version or len(vectors) != len(knowledge.passages):
+        logger.info(f"Vector store {path} was built from other knowledge; rebuilding in the background")
+        return None
+    return vectors
@@ -0,0 +1,213 @@
+"""
+Write-behind persistence for chat turns
+Routes answer first; a background task flushes conversation appends and
+analytics rollups to Mongo in bulk_write batches sized by count and age.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+from ..config import settings
+from ..database import get_collection
+from . import analytics_rollup, conversation_store
+from .latency import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PendingTurn:
+    client_id: str
+    session_id: str
+    messages: List[Dict]
+    latency_ms: Optional[float] = None
+    stages: Dict[str, float] = field(default_factory=dict)
+    at: datetime = field(default_factory=datetime.utcnow)
+
+
+class ChatTurnWriter:
+    def __init__(self, max_queue: int = 10000, batch_size: int = 200, max_age: float = 0.05, max_retries: int = 3):
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.max_retries = max_retries
+        self._pending: Deque[Tuple[float, PendingTurn]] = deque()
+        # One slot per queued turn; enqueue waits when all are taken (backpressure)
+        self._slots = asyncio.Semaphore(max_queue)
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.flush_latency = LatencyHistogram()
+        self.enqueue_wait = LatencyHistogram()
+
+    async def enqueue(self, turn: PendingTurn):
+        """Queue a turn for persistence, waiting if the queue is full"""
+        started = time.perf_counter()
+        await self._slots.acquire()
+        self.enqueue_wait.record((time.perf_counter() - started) * 1000)
+        self.enqueued += 1
+
+        if self._task is None:
+            # No background writer (scripts, shutdown): write through
+            try:
+                await self._flush_with_retry([turn])
+            finally:
+                self._slots.release()
+            return
+
+        self._pending.append((time.monotonic(), turn))
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Let a batch build up until it is full or its oldest turn is max_age old
+            oldest = self._pending[0][0]
+            while len(self._pending) < self.batch_size and not self._closing:
+                remaining = self.max_age - (time.monotonic() - oldest)
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [self._pending.popleft()[1] for _ in range(min(self.batch_size, len(self._pending)))]
+            try:
+                await self._flush_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._slots.release()
+
+    async def _flush_with_retry(self, batch: List[PendingTurn]):
+        # Sequence numbers are reserved once per batch and kept across
+        # attempts; a retry only replays the (idempotent) writes
+        sessions: Dict[Tuple[str, str], List[PendingTurn]] = {}
+        for turn in batch:
+            sessions.setdefault((turn.client_id, turn.session_id), []).append(turn)
+        reservations: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        now = datetime.utcnow()
+
+        for attempt in range(self.max_retries):
+            try:
+                await self._flush(sessions, reservations, now)
+                self.flushed += len(batch)
+                return
+            except Exception as e:
+                logger.warning(f"Chat turn flush failed (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        self.dropped += len(batch)
+        logger.error(f"Dropped {len(batch)} chat turns after {self.max_retries} attempts")
+
+    async def _reserve(
+        self,
+        sessions: Dict[Tuple[str, str], List[PendingTurn]],
+        reservations: Dict[Tuple[str, str], Tuple[int, int]],
+        now: datetime
+    ):
+        """Claim sequence numbers for every session that does not hold a range yet"""
+        missing = [key for key in sessions if key not in reservations]
+        results = await asyncio.gather(*(
+            conversation_store.reserve_sequences(
+                client_id, session_id, sum(len(t.messages) for t in sessions[(client_id, session_id)]), now
+            )
+            for client_id, session_id in missing
+        ), return_exceptions=True)
+        error = None
+        for key, result in zip(missing, results):
+            if isinstance(result, Exception):
+                error = result
+            else:
+                reservations[key] = result
+        if error is not None:
+            raise error
+
+    async def _flush(
+        self,
+        sessions: Dict[Tuple[str, str], List[PendingTurn]],
+        reservations: Dict[Tuple[str, str], Tuple[int, int]],
+        now: datetime
+    ):
+        started = time.perf_counter()
+        pages_collection = get_collection("conversation_messages")
+        rollups_collection = get_collection("analytics_rollups")
+        if pages_collection is None:
+            raise RuntimeError("database unavailable")
+
+        # One header update per session claims sequence numbers for all its turns
+        await self._reserve(sessions, reservations, now)
+
+        page_ops = []
+        rollup_events = []
+        for (client_id, session_id), turns in sessions.items():
+            first_seq, page_size = reservations[(client_id, session_id)]
+            messages = [message for turn in turns for message in turn.messages]
+            page_ops.extend(conversation_store.page_updates(client_id, session_id, messages, first_seq, page_size, now))
+            for i, turn in enumerate(turns):
+                rollup_events.append((
+                    client_id,
+                    analytics_rollup.build_increments(
+                        chats=int(first_seq == 0 and i == 0),
+                        messages=len(turn.messages),
+                        latency_ms=turn.latency_ms,
+                        stages=turn.stages
+                    ),
+                    turn.at
+                ))
+
+        await pages_collection.bulk_write(page_ops, ordered=False)
+
+        if rollups_collection is not None:
+            try:
+                await rollups_collection.bulk_write(analytics_rollup.merged_updates(rollup_events), ordered=False)
+            except Exception as e:
+                # Counters are not idempotent; retrying could count turns twice, so only log
+                logger.warning(f"Analytics rollup update failed: {e}")
+
+        self.batches += 1
+        self.flush_latency.record((time.perf_counter() - started) * 1000)
+
+    def start(self):
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the writer"""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": len(self._pending),
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "flush_latency": self.flush_latency.summary(),
+            "enqueue_wait": self.enqueue_wait.summary(),
+        }
+
+
+chat_writer = ChatTurnWriter(
+    max_queue=settings.write_behind_max_queue,
+    batch_size=settings.write_behind_batch_size,
+    max_age=settings.write_behind_max_age,
+)
@@ -3,6 +3,7 @@ Simple Setup Script - Run from backend/ directory
 No complex imports, direct execution
 """
 
+import importlib.util
 import os
 import json
 import sys
@@ -13,6 +14,13 @@ def setup_python_path():
     sys.path.insert(0, backend_dir)
     print(f"✓ Python path: {backend_dir}\n")
 
+def require_packages(*modules, install):
+    """Exit with an install hint if any module the step imports is missing"""
+    if any(importlib.util.find_spec(module) is None for module in modules):
+        print(" Missing packages!")
+        print(f"Run: pip install {install}")
+        sys.exit(1)
+
 def check_structure():
     """Verify folder structure"""
     if not os.path.exists('app'):
@@ -33,83 +41,61 @@ def scrape_website():
     print(" STEP 1: Scraping Prodesk Website")
     print("=" * 60)
     
-    try:
-        import requests
-        from bs4 import BeautifulSoup
-    except ImportError:
-        print(" Missing packages!")
-        print("Run: pip install requests beautifulsoup4 lxml")
-        sys.exit(1)
+    # The fetcher uses httpx, the extractor lxml
+    require_packages("httpx", "lxml", install="httpx lxml")
     
-    base_url = "https://prodesk.in"
-    pages = [
-        "/",
-        "/services",
-        "/software-development",
-        "/who-we-are-1",
-        "/what-we-do-1"
-    ]
-    
-    knowledge = []
-    
-    for page in pages:
-        url = base_url + page
-        try:
-            print(f"  Scraping: {url}")
-            response = requests.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove unwanted elements
-            for tag in soup(['script', 'style', 'nav', 'footer', 'header']):
-                tag.decompose()
-            
-            # Extract text
-            text = soup.get_text(separator=' ', strip=True)
-            text = ' '.join(text.split())
-            
-            if text:
-                knowledge.append({
-                    "url": url,
-                    "content": text,
-                    "source": page,
-                    "word_count": len(text.split())
-                })
-                print(f"  ✓ Success ({len(text.split())} words)")
-            else:
-                print(f"  ✗ No content found")
-                
-        except Exception as e:
-            print(f"  ✗ Error: {e}")
-    
-    # Save to file
+    from app.services.scraper import WebScraper
+    
+    # Same concurrent fetcher as the API's scraper; unchanged pages are
+    # answered with 304 and reused from the previous run
     os.makedirs('data', exist_ok=True)
     filepath = 'data/prodesk_knowledge.json'
+    scraper = WebScraper()
+    print(f"  Scraping {len(scraper.pages)} pages from {scraper.base_url}")
+    knowledge = scraper.save_to_file(filepath)
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(knowledge, f, indent=2, ensure_ascii=False)
-    
-    total_words = sum(p['word_count'] for p in knowledge)
-    print(f"\n Scraping complete!")
+    total_words = sum(p.get('word_count', 0) for p in knowledge)
+    print("\n Scraping complete!")
     print(f"   Pages scraped: {len(knowledge)}")
     print(f"   Total words: {total_words}")
     print(f"   Saved to: {filepath}\n")
     
     return len(knowledge) > 0
 
+def compile_knowledge():
+    """Step 2: Compile the knowledge snapshot the API maps at startup"""
+    print("=" * 60)
+    print(" STEP 2: Compiling Knowledge Snapshot")
+    print("=" * 60)
+    
+    from app.config import settings
+    from app.services.snapshot import compile_snapshot
+    
+    knowledge_file = 'data/prodesk_knowledge.json'
+    if not os.path.exists(knowledge_file):
+        print(f" Knowledge file not found: {knowledge_file}")
+        return False
+    
+    meta = compile_snapshot(knowledge_file, settings.knowledge_snapshot_path)
+    report = meta['report']
+    print(f"  ✓ {meta['passages']} passages from {meta['pages']} pages")
+    print(f"  ✓ {report['bytes_saved']} bytes of boilerplate, {report['duplicate_passages']} duplicate passages removed")
+    print(f"   Saved to: {settings.knowledge_snapshot_path} ({meta['bytes']} bytes)\n")
+    
+    return True
+
 def create_vectorstore():
-    """Step 2: Create FAISS vector store"""
+    """Step 3: Build the dense vector store (CPU only, no model download)"""
     print("=" * 60)
-    print(" STEP 2: Creating Vector Store")
+    print(" STEP 3: Creating Vector Store")
     print("=" * 60)
     
-    try:
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        from langchain_community.vectorstores import FAISS
-        from langchain_community.embeddings import HuggingFaceEmbeddings
-    except ImportError:
-        print(" Missing packages!")
-        print("Run: pip install langchain langchain-community sentence-transformers faiss-cpu")
-        sys.exit(1)
+    require_packages("numpy", install="numpy")
+    
+    from app.config import settings
+    from app.services.dedup import BoilerplateRemover
+    from app.services.knowledge_index import build_corpus
+    from app.services.vector_index import build_vectors
     
     # Load knowledge
     knowledge_file = 'data/prodesk_knowledge.json'
@@ -123,41 +109,17 @@ def create_vectorstore():
     
     print(f"  ✓ Loaded {len(docs)} documents")
     
-    # Split into chunks
-    print("  Splitting into chunks...")
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=50
-    )
+    # Same cleaned passages, in the same order, as the API's keyword index
+    knowledge, _ = build_corpus(docs, BoilerplateRemover())
+    print(f"  ✓ Created {len(knowledge.passages)} chunks")
     
-    texts = []
-    metadatas = []
+    print("  Embedding passages (hashed TF-IDF + SVD)...")
+    vectors = build_vectors(knowledge)
+    vectors.save(settings.vectorstore_path)
     
-    for doc in docs:
-        chunks = splitter.split_text(doc['content'])
-        texts.extend(chunks)
-        metadatas.extend([{"source": doc['source']} for _ in chunks])
-    
-    print(f"  ✓ Created {len(texts)} chunks")
-    
-    # Create embeddings
-    print("  Creating embeddings (this may take a minute)...")
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
-    
-    # Create vectorstore
-    print("  Building FAISS index...")
-    vectorstore = FAISS.from_texts(texts, embeddings, metadatas=metadatas)
-    
-    # Save
-    vectorstore_path = 'data/vectorstore'
-    os.makedirs(vectorstore_path, exist_ok=True)
-    vectorstore.save_local(vectorstore_path)
-    
-    print(f"\n Vector store created!")
-    print(f"   Chunks: {len(texts)}")
-    print(f"   Saved to: {vectorstore_path}\n")
+    print("\n Vector store created!")
+    print(f"   Chunks: {len(vectors)} x {vectors.dim} dims{' (int8)' if vectors.quantized else ''}")
+    print(f"   Saved to: {settings.vectorstore_path}\n")
     
     return True
 
@@ -178,7 +140,12 @@ def main():
         print(" Setup failed at scraping step")
         return
     
-    # Step 2: Vectorstore
+    # Step 2: Knowledge snapshot
+    if not compile_knowledge():
+        print(" Setup failed at snapshot step")
+        return
+    
+    # Step 3: Vectorstore
     if not create_vectorstore():
         print("Setup failed at vectorstore step")
         return
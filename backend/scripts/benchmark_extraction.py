@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark HTML extraction over a corpus of saved HTML fixtures
+
+Compares the old BeautifulSoup html.parser + decompose() path with the
+shared lxml extractor, inline and across a process pool.
+
+Usage:
+    python scripts/benchmark_extraction.py [--fixtures DIR] [--copies N] [--workers N]
+
+data/html_fixtures holds markup reconstructed from the text of the five
+crawled pages in data/prodesk_knowledge.json, laid out like site-builder
+output (atomic CSS, widget bootstrap scripts, deep nesting). They are not
+downloaded pages, so timings on them approximate a real crawl.
+With an empty --fixtures directory, documents are synthesized from
+data/prodesk_knowledge.json wrapped in simple site chrome; pass
+--write-fixtures to save them for later runs.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app.services.extraction import DEFAULT_STRIP, extract, extract_many
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_FIXTURES = os.path.join(BACKEND_DIR, 'data', 'html_fixtures')
+KNOWLEDGE_FILE = os.path.join(BACKEND_DIR, 'data', 'prodesk_knowledge.json')
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<meta name="description" content="{title}">
+<link rel="stylesheet" href="/static/site.css">
+<style>body {{ font-family: sans-serif; }} .hero {{ padding: 2rem; }}</style>
+<script>window.dataLayer = window.dataLayer || []; function gtag(){{dataLayer.push(arguments);}}</script>
+</head>
+<body>
+<header><div class="logo">PRODESK</div></header>
+<nav><ul>{menu}</ul></nav>
+<main><section class="hero"><h1>{title}</h1></section>{paragraphs}</main>
+<footer><p>Copyright Prodesk. All rights reserved.</p><ul>{menu}</ul></footer>
+<script src="/static/app.js"></script>
+</body>
+</html>
+"""
+
+
+def synthesize(entries: List[dict]) -> List[Tuple[str, bytes]]:
+    """Wrap knowledge entries in realistic page chrome"""
+    menu = "".join(f'<li><a href="/page-{i}">Menu item {i}</a></li>' for i in range(25))
+    docs = []
+    for i, entry in enumerate(entries):
+        words = entry.get('content', '').split()
+        paragraphs = "".join(
+            f"<div class=\"block\"><p>{' '.join(words[j:j + 60])}</p></div>"
+            for j in range(0, len(words), 60)
+        )
+        html = PAGE_TEMPLATE.format(title=entry.get('source') or f"Page {i}", menu=menu, paragraphs=paragraphs)
+        docs.append((entry.get('url') or f"page-{i}", html.encode('utf-8')))
+    return docs
+
+
+def load_fixtures(directory: str) -> List[Tuple[str, bytes]]:
+    docs = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, 'rb') as f:
+            docs.append((os.path.basename(path), f.read()))
+    return docs
+
+
+def soup_decompose(content: bytes) -> str:
+    """The parsing path the scrapers used before the shared extractor"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    for element in soup(list(DEFAULT_STRIP)):
+        element.decompose()
+    return ' '.join(soup.get_text(separator=' ', strip=True).split())
+
+
+def run(name: str, docs: List[Tuple[str, bytes]], fn: Callable[[List[Tuple[str, bytes]]], int]) -> float:
+    total_bytes = sum(len(content) for _, content in docs)
+    started = time.perf_counter()
+    chars = fn(docs)
+    elapsed = time.perf_counter() - started
+    print(
+        f"  {name:<28} {elapsed * 1000:9.1f} ms  {len(docs) / elapsed:9.1f} pages/s  "
+        f"{total_bytes / elapsed / 1e6:7.1f} MB/s  ({chars} chars)"
+    )
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help='Directory of *.html fixtures')
+    parser.add_argument('--copies', type=int, default=200, help='Repeat the corpus to this many copies')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Process pool size')
+    parser.add_argument('--write-fixtures', action='store_true', help='Save synthesized fixtures to --fixtures')
+    args = parser.parse_args()
+
+    docs = load_fixtures(args.fixtures)
+    source = args.fixtures
+    if not docs:
+        with open(KNOWLEDGE_FILE, 'r', encoding='utf-8') as f:
+            docs = synthesize(json.load(f))
+        source = f"synthesized from {os.path.relpath(KNOWLEDGE_FILE)}"
+        if args.write_fixtures:
+            os.makedirs(args.fixtures, exist_ok=True)
+            for i, (_, content) in enumerate(docs):
+                with open(os.path.join(args.fixtures, f'page_{i:03d}.html'), 'wb') as f:
+                    f.write(content)
+            print(f"Wrote {len(docs)} fixtures to {args.fixtures}")
+
+    corpus = docs * args.copies
+    size_mb = sum(len(content) for _, content in corpus) / 1e6
+    print(f"Corpus: {len(docs)} documents ({source}) x {args.copies} = {len(corpus)} pages, {size_mb:.1f} MB\n")
+
+    baseline = run("bs4 html.parser+decompose", corpus, lambda d: sum(len(soup_decompose(c)) for _, c in d))
+    fast = run("lxml single pass", corpus, lambda d: sum(len(extract(c)['text']) for _, c in d))
+    pooled = run(
+        f"lxml x {args.workers} processes",
+        corpus,
+        lambda d: sum(len(page['text']) for _, page in extract_many(d, workers=args.workers))
+    )
+
+    print(f"\n  lxml speedup: {baseline / fast:.1f}x inline, {baseline / pooled:.1f}x pooled")
+
+
+if __name__ == "__main__":
+    main()
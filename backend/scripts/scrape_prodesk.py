@@ -4,14 +4,22 @@ Prodesk Website Scraper
 Scrapes content from Prodesk website for chatbot knowledge base
 """
 
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import asyncio
 import json
+import os
+import sys
 import time
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional
 from urllib.parse import urljoin, urlparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app.services.crawler import crawl_site
+from app.services.extraction import DEFAULT_STRIP, extract
+from app.services.fetcher import Fetcher
+from app.services.scraper import load_previous, state_path_for
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,12 +30,12 @@ logger = logging.getLogger(__name__)
 class ProdeskScraper:
     """Web scraper for Prodesk website"""
     
-    def __init__(self, base_url: str = "https://prodesk.in"):
+    def __init__(self, base_url: str = "https://prodesk.in", **fetch_options):
         self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        self.fetch_options = {
+            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            **fetch_options
+        }
         
         # Pages to scrape
         self.pages = [
@@ -46,110 +54,80 @@ class ProdeskScraper:
         text = text.replace('\n', ' ').replace('\r', ' ')
         return text.strip()
     
-    def scrape_page(self, url: str) -> Dict[str, str]:
+    def parse_page(self, url: str, content: bytes) -> Dict[str, str]:
         """
-        Scrape a single page
+        Parse a fetched page
         
         Args:
-            url: URL to scrape
+            url: URL the page was fetched from
+            content: Raw HTML
             
         Returns:
             Dictionary with page data
         """
-        try:
-            logger.info(f"Scraping: {url}")
-            
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove unwanted elements
-            for element in soup(['script', 'style', 'nav', 'footer', 'header', 'meta', 'link']):
-                element.decompose()
-            
-            # Extract title
-            title = soup.find('title')
-            page_title = title.get_text(strip=True) if title else url
-            
-            # Extract main content
-            # Try to find main content area
-            main_content = (
-                soup.find('main') or 
-                soup.find('article') or 
-                soup.find('div', class_=['content', 'main-content', 'page-content']) or
-                soup.find('body')
-            )
-            
-            if main_content:
-                text = main_content.get_text(separator=' ', strip=True)
-            else:
-                text = soup.get_text(separator=' ', strip=True)
-            
-            # Clean text
-            cleaned_text = self.clean_text(text)
-            
-            # Extract metadata
-            description = soup.find('meta', {'name': 'description'})
-            meta_description = description.get('content', '') if description else ''
-            
-            return {
-                "url": url,
-                "title": page_title,
-                "content": cleaned_text,
-                "description": meta_description,
-                "source": url.replace(self.base_url, "") or "/",
-                "word_count": len(cleaned_text.split()),
-                "scraped_at": time.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-        except requests.RequestException as e:
-            logger.error(f"Error scraping {url}: {e}")
-            return {
-                "url": url,
-                "title": "",
-                "content": "",
-                "description": "",
-                "source": url.replace(self.base_url, ""),
-                "word_count": 0,
-                "error": str(e)
-            }
+        # Text comes from the main content area, falling back to <body>
+        page = extract(content, strip=DEFAULT_STRIP + ('meta', 'link'), main_only=True)
+        cleaned_text = self.clean_text(page["text"])
         
-        except Exception as e:
-            logger.error(f"Unexpected error scraping {url}: {e}")
-            return {
-                "url": url,
-                "content": "",
-                "error": str(e)
-            }
+        return {
+            "url": url,
+            "title": page["title"] or url,
+            "content": cleaned_text,
+            "description": page["description"],
+            "source": url.replace(self.base_url, "") or "/",
+            "word_count": len(cleaned_text.split()),
+            "scraped_at": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
     
-    def scrape_all(self) -> List[Dict[str, str]]:
+    async def scrape(self, previous: Optional[List[Dict]] = None, state_path: Optional[str] = None) -> List[Dict[str, str]]:
         """
-        Scrape all configured pages
+        Scrape all configured pages concurrently
         
+        Args:
+            previous: Pages from an earlier run, reused when unchanged
+            state_path: Where ETag/Last-Modified validators are kept
+            
         Returns:
             List of page data dictionaries
         """
-        knowledge_base = []
+        previous_by_url = {page["url"]: page for page in previous or [] if page.get("content")}
+        urls = [urljoin(self.base_url, page_path) for page_path in self.pages]
+        scraped = {}
         
-        logger.info(f"Starting scraping of {len(self.pages)} pages...")
+        logger.info(f"Starting scraping of {len(urls)} pages...")
         
-        for page_path in self.pages:
-            url = urljoin(self.base_url, page_path)
-            data = self.scrape_page(url)
-            
-            if data.get("content"):
-                knowledge_base.append(data)
-                logger.info(f"✓ Scraped {url} ({data['word_count']} words)")
-            else:
-                logger.warning(f"✗ No content from {url}")
-            
-            # Be polite - add delay between requests
-            time.sleep(1)
+        async with Fetcher(state_path=state_path, **self.fetch_options) as fetcher:
+            async for result in fetcher.fetch_all(urls, conditional=previous_by_url):
+                if result.unchanged:
+                    scraped[result.url] = previous_by_url[result.url]
+                    logger.info(f"= Unchanged {result.url}")
+                elif result.ok:
+                    data = self.parse_page(result.url, result.content)
+                    if data["content"]:
+                        scraped[result.url] = data
+                        logger.info(f"✓ Scraped {result.url} ({data['word_count']} words)")
+                    else:
+                        logger.warning(f"✗ No content from {result.url}")
+                elif result.url in previous_by_url:
+                    scraped[result.url] = previous_by_url[result.url]
+                    logger.warning(f"✗ {result.error} from {result.url}, keeping previous content")
+                else:
+                    logger.warning(f"✗ {result.error} from {result.url}")
+            logger.info(f"Fetch stats: {fetcher.stats}")
         
+        knowledge_base = [scraped[url] for url in urls if url in scraped]
         logger.info(f"Scraping complete. Collected {len(knowledge_base)} pages.")
         return knowledge_base
     
+    def scrape_all(self) -> List[Dict[str, str]]:
+        """
+        Scrape all configured pages
+        
+        Returns:
+            List of page data dictionaries
+        """
+        return asyncio.run(self.scrape())
+    
     def save_to_file(self, filepath: str = "../backend/data/prodesk_knowledge.json"):
         """
         Scrape and save to JSON file
@@ -157,7 +135,7 @@ class ProdeskScraper:
         Args:
             filepath: Path to save JSON file
         """
-        knowledge = self.scrape_all()
+        knowledge = asyncio.run(self.scrape(load_previous(filepath), state_path_for(filepath)))
         
         # Calculate statistics
         total_words = sum(page.get('word_count', 0) for page in knowledge)
@@ -174,7 +152,6 @@ class ProdeskScraper:
         }
         
         # Ensure directory exists
-        import os
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         
         # Save to file
@@ -186,6 +163,33 @@ class ProdeskScraper:
         
         return knowledge
     
+    def crawl_to_file(self, filepath: str = "../backend/data/prodesk_knowledge.json", max_pages: int = 200, max_depth: int = 3) -> int:
+        """
+        Crawl the site from the base URL and sitemap.xml instead of the fixed page list
+        
+        Pages are parsed and written as they arrive, as a plain JSON list.
+        
+        Args:
+            filepath: Path to save JSON file
+            max_pages: Stop after fetching this many pages
+            max_depth: Maximum link depth from the base URL
+            
+        Returns:
+            Number of pages saved
+        """
+        count = asyncio.run(crawl_site(
+            self.base_url,
+            self.parse_page,
+            filepath,
+            previous=load_previous(filepath),
+            state_path=state_path_for(filepath),
+            max_pages=max_pages,
+            max_depth=max_depth,
+            fetch_options=self.fetch_options
+        ))
+        logger.info(f"✅ Saved {count} crawled pages to {filepath}")
+        return count
+    
     def extract_structured_data(self) -> Dict:
         """
         Extract structured information about Prodesk
@@ -237,11 +241,21 @@ def main():
     print("Prodesk Website Scraper")
     print("=" * 60)
     
+    parser = argparse.ArgumentParser(description="Scrape a website into a chatbot knowledge base")
+    parser.add_argument("--base-url", default="https://prodesk.in")
+    parser.add_argument("--crawl", action="store_true", help="Follow links and sitemap.xml instead of the fixed page list")
+    parser.add_argument("--max-pages", type=int, default=200)
+    parser.add_argument("--max-depth", type=int, default=3)
+    args = parser.parse_args()
+    
     # Initialize scraper
-    scraper = ProdeskScraper()
+    scraper = ProdeskScraper(args.base_url)
     
     # Scrape and save
-    scraper.save_to_file()
+    if args.crawl:
+        scraper.crawl_to_file(max_pages=args.max_pages, max_depth=args.max_depth)
+    else:
+        scraper.save_to_file()
     
     # Extract structured data
     structured = scraper.extract_structured_data()
@@ -1,9 +1,14 @@
+import json
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
 from app.services.scraper import WebScraper
-from app.services.rag_service import RAGService
+from app.config import settings
+from app.services.dedup import BoilerplateRemover
+from app.services.knowledge_index import build_corpus
+from app.services.snapshot import compile_snapshot
+from app.services.vector_index import build_vectors
 
 def main():
     print("Setting up Prodesk Chatbot Platform...")
@@ -13,9 +18,22 @@ def main():
     scraper = WebScraper()
     scraper.save_to_file("../backend/data/prodesk_knowledge.json")
     
-    # Step 2: Create vectorstore
+    # Step 2: Compile the snapshot the API maps at startup
+    print("Compiling knowledge snapshot...")
+    backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    meta = compile_snapshot(
+        os.path.join(backend_dir, "data", "prodesk_knowledge.json"),
+        os.path.join(backend_dir, settings.knowledge_snapshot_path)
+    )
+    print(f"Indexed {meta['passages']} passages from {meta['pages']} pages ({meta['bytes']} bytes)")
+    
+    # Step 3: Embed the same passages for dense retrieval
     print("Creating vector store...")
-    rag = RAGService()
+    with open(os.path.join(backend_dir, "data", "prodesk_knowledge.json"), "r", encoding="utf-8") as f:
+        knowledge, _ = build_corpus(json.load(f), BoilerplateRemover())
+    vectors = build_vectors(knowledge)
+    vectors.save(os.path.join(backend_dir, settings.vectorstore_path))
+    print(f"Embedded {len(vectors)} passages into {vectors.dim} dims")
     
     print("\nSetup complete!")
     print("\nNext steps:")
@@ -9,12 +9,31 @@ const api = axios.create({
   },
 });
 
+// Follows X-Next-Cursor until the last page; resolves like a single
+// response whose data holds every item
+const PAGE_SIZE = 500;
+
+const getAllPages = async (url, config = {}) => {
+  const items = [];
+  let cursor;
+  let response;
+  do {
+    response = await api.get(url, {
+      ...config,
+      params: { ...config.params, limit: PAGE_SIZE, cursor },
+    });
+    items.push(...response.data);
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+  return { ...response, data: items };
+};
+
 // Client APIs
 export const createClient = (clientData) => 
   api.post('/api/clients', clientData);
 
 export const listClients = () => 
-  api.get('/api/clients');
+  getAllPages('/api/clients');
 
 export const getClient = (clientId) => 
   api.get(`/api/clients/${clientId}`);
@@ -26,7 +45,7 @@ export const getAnalytics = (apiKey) =>
   });
 
 export const getLeads = (apiKey) => 
-  api.get('/api/analytics/leads', {
+  getAllPages('/api/analytics/leads', {
     headers: { 'X-API-Key': apiKey }
   });
 